@@ -1,10 +1,13 @@
 import os
 from pathlib import Path
 
-def generate_directory_tree(root_dir, max_depth=float('inf'), ignore_hidden=True,
-                            ignore_patterns=None, show_files=True):
+def iter_directory_tree(root_dir, max_depth=float('inf'), ignore_hidden=True,
+                        ignore_patterns=None, show_files=True, max_children=None, summary=False):
     """
-    生成指定目录的文件树
+    逐行生成指定目录的文件树
+
+    使用 os.scandir 迭代遍历（显式栈，无递归），直接复用 DirEntry 中的类型信息，
+    不会进入超过 max_depth 的目录；结果以生成器逐行返回，不在内存中拼接整棵树。
 
     参数:
     root_dir (str): 根目录路径
@@ -12,66 +15,112 @@ def generate_directory_tree(root_dir, max_depth=float('inf'), ignore_hidden=True
     ignore_hidden (bool): 是否忽略隐藏文件，默认为True
     ignore_patterns (list): 要忽略的文件或目录名列表，默认为None
     show_files (bool): 是否显示文件，默认为True
+    max_children (int): 每个目录最多显示的子项数，超出部分汇总为一行，默认为不限制
+    summary (bool): 是否在末尾输出目录和文件数量统计，默认为False
     """
     if ignore_patterns is None:
         ignore_patterns = []
 
-    root_path = Path(root_dir)
-    if not root_path.exists():
+    if not os.path.exists(root_dir):
         print(f"错误: 目录 '{root_dir}' 不存在")
         return
 
-    tree = []
+    def is_ignored(name):
+        if ignore_hidden and name.startswith('.'):
+            return True
+        return any(pattern in name for pattern in ignore_patterns)
+
+    def list_children(path):
+        """读取并排序（文件夹优先）一个目录的子项，返回 (子项列表, 被截断的数量)"""
+        children = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if is_ignored(entry.name):
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir and not show_files:
+                        continue
+                    children.append((not is_dir, entry.name, entry.path))
+        except OSError as e:
+            print(f"无法访问 {path}: {e}")
+        children.sort()
+        if max_children is not None and len(children) > max_children:
+            return children[:max_children], len(children) - max_children
+        return children, 0
+
+    root_path = Path(root_dir)
+    if is_ignored(root_path.name):
+        return
+    root_is_dir = root_path.is_dir()
+    if not root_is_dir and not show_files:
+        return
+
+    dir_count = file_count = omitted_count = 0
+    yield f"{root_path.name}/"
 
-    def _generate_tree(path, prefix='', depth=0):
-        if depth > max_depth:
-            return
+    # 栈中每项为 (是否为文件, 名称, 路径, 深度)；名称为 None 表示"还有 N 项"汇总行
+    stack = []
 
-        # 检查是否应该忽略当前路径
-        if ignore_hidden and path.name.startswith('.'):
-            return
-        if any(pattern in path.name for pattern in ignore_patterns):
-            return
+    def push_children(path, depth):
+        nonlocal omitted_count
+        children, omitted = list_children(path)
+        if omitted:
+            omitted_count += omitted
+            stack.append((True, None, omitted, depth))
+        for is_file, name, child_path in reversed(children):
+            stack.append((is_file, name, child_path, depth))
 
-        # 确定当前项的显示前缀
-        is_dir = path.is_dir()
-        if not is_dir and not show_files:
-            return
+    if root_is_dir and max_depth >= 1:
+        push_children(root_dir, 1)
 
-        # 生成当前项的显示行
-        if depth == 0:
-            line = f"{path.name}/"
+    while stack:
+        is_file, name, path, depth = stack.pop()
+        indent = '  ' * (depth + 1)
+        if name is None:
+            yield f"{indent}... (还有 {path} 项)"
+            continue
+        if is_file:
+            file_count += 1
+            yield f"{indent}{name}"
         else:
-            line = f"{prefix}  {path.name}"
-            if is_dir:
-                line += "/"
-        tree.append(line)
-
-        # 如果是目录，递归生成子树
-        if is_dir:
-            children = list(path.iterdir())
-            # 按文件夹优先排序
-            children.sort(key=lambda x: (not x.is_dir(), x.name))
-
-            for i, child in enumerate(children):
-                # 为子项计算新的前缀
-                if i == len(children) - 1:
-                    new_prefix = f"{prefix}  "
-                else:
-                    new_prefix = f"{prefix}  "
-                _generate_tree(child, new_prefix, depth + 1)
-
-    _generate_tree(root_path)
-    return "\n".join(tree)
+            dir_count += 1
+            yield f"{indent}{name}/"
+            if depth < max_depth:
+                push_children(path, depth + 1)
+
+    if summary:
+        line = f"\n{dir_count} 个目录, {file_count} 个文件"
+        if omitted_count:
+            line += f"（另有 {omitted_count} 项未显示）"
+        yield line
+
+def generate_directory_tree(root_dir, max_depth=float('inf'), ignore_hidden=True,
+                            ignore_patterns=None, show_files=True, max_children=None, summary=False):
+    """
+    生成指定目录的文件树
+
+    参数同 iter_directory_tree，返回拼接好的字符串；目录不存在时返回 None
+    """
+    if not os.path.exists(root_dir):
+        print(f"错误: 目录 '{root_dir}' 不存在")
+        return
+    return "\n".join(iter_directory_tree(root_dir, max_depth, ignore_hidden, ignore_patterns,
+                                         show_files, max_children, summary))
 
 if __name__ == "__main__":
-    # 示例：生成当前目录的文件树
+    # 示例：生成当前目录的文件树（逐行输出，适合非常大的目录）
     current_dir = r"C:\Users\root\Downloads\x"
-    tree = generate_directory_tree(
+    for line in iter_directory_tree(
         current_dir,
         max_depth=3,
         ignore_hidden=True,
         ignore_patterns=['__pycache__', '.git'],
-        show_files=True
-    )
-    print(tree)
\ No newline at end of file
+        show_files=True,
+        max_children=200,
+        summary=True
+    ):
+        print(line)
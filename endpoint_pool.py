@@ -0,0 +1,179 @@
+import time
+import asyncio
+from collections import deque
+import aiohttp
+
+DEFAULT_ENDPOINTS = ["http://127.0.0.1:1337/v1/chat/completions"]
+
+
+class Endpoint:
+    """一个 OpenAI 兼容的 chat/completions 端点及其延迟统计"""
+
+    __slots__ = ("url", "ewma", "samples", "inflight", "failures", "consecutive_failures", "latencies")
+
+    def __init__(self, url, window=200):
+        self.url = url
+        self.ewma = None
+        self.samples = 0
+        self.inflight = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, latency, alpha=0.2):
+        self.ewma = latency if self.ewma is None else alpha * latency + (1 - alpha) * self.ewma
+        self.samples += 1
+        self.consecutive_failures = 0
+        self.latencies.append(latency)
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+
+    def is_unmeasured(self):
+        """既没有成功也没有失败过的端点，需要先探测"""
+        return self.samples == 0 and self.failures == 0
+
+    def expected_latency(self, default):
+        """
+        预估在该端点上再发一个请求的耗时：平均延迟按排队的请求数放大，连续失败时加倍惩罚
+
+        从未成功过的端点以 default（通常为全池的延迟上限）为平均延迟，失败后同样被惩罚而不会一直被优先选中。
+        """
+        ewma = self.ewma if self.ewma is not None else default
+        return ewma * (1 + self.inflight) * 2 ** min(self.consecutive_failures, 5)
+
+
+def quantile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class EndpointPool:
+    """
+    多端点请求池：按延迟选择端点，慢请求发送备份请求（hedged request）
+
+    每个请求发往预估延迟最低的端点（从未请求过的端点优先，用于探测）。
+    请求超过全池最近延迟的 p95 仍未返回时，向另一个端点再发一份，采用先返回的结果并取消另一个；
+    请求失败时换一个端点重试。只有一个端点时备份请求发往同一端点，仍能绕过个别卡住的连接。
+    """
+
+    def __init__(self, urls=None, timeout=600, hedge_quantile=0.95, min_samples=20, initial_hedge_delay=120,
+                 max_attempts=3, window=200):
+        self.endpoints = [Endpoint(url, window) for url in (urls or DEFAULT_ENDPOINTS)]
+        self.timeout = timeout
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.initial_hedge_delay = initial_hedge_delay
+        self.max_attempts = max_attempts
+        self.latencies = deque(maxlen=window)
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._session = None
+
+    def choose(self, exclude=()):
+        candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude] or self.endpoints
+        unmeasured = [endpoint for endpoint in candidates if endpoint.is_unmeasured()]
+        if unmeasured:
+            return min(unmeasured, key=lambda endpoint: endpoint.inflight)
+        default = max(self.latencies) if self.latencies else self.initial_hedge_delay
+        return min(candidates, key=lambda endpoint: endpoint.expected_latency(default))
+
+    def hedge_delay(self):
+        """发送备份请求前的等待时间：样本足够时取最近延迟的 p95，否则为 initial_hedge_delay"""
+        if len(self.latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        return quantile(self.latencies, self.hedge_quantile)
+
+    async def _post(self, endpoint, request_data):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        endpoint.inflight += 1
+        start = time.monotonic()
+        try:
+            async with self._session.post(endpoint.url, json=request_data) as response:
+                response.raise_for_status()
+                response_data = await response.json()
+            if not response_data.get('choices'):
+                raise ValueError(f"响应中没有结果: {str(response_data)[:200]}")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            endpoint.record_failure()
+            raise
+        else:
+            latency = time.monotonic() - start
+            endpoint.record(latency)
+            self.latencies.append(latency)
+            return response_data
+        finally:
+            endpoint.inflight -= 1
+
+    async def request(self, request_data):
+        """发送请求并返回响应 JSON；所有尝试都失败时抛出最后一个异常"""
+        tasks = {}
+        backups = set()
+        failed = set()
+        attempts = 0
+        hedged = False  # 当前这一轮是否已发送备份请求
+        last_error = None
+
+        def launch(exclude):
+            nonlocal attempts
+            endpoint = self.choose(exclude)
+            task = asyncio.create_task(self._post(endpoint, request_data))
+            tasks[task] = endpoint
+            attempts += 1
+            return task
+
+        launch(failed)
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=None if hedged else self.hedge_delay(),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 超过 p95 仍未返回：向另一个端点发送备份请求
+                    hedged = True
+                    self.hedges += 1
+                    backups.add(launch(failed | set(tasks.values())))
+                    continue
+                for task in done:
+                    endpoint = tasks.pop(task)
+                    if task.exception() is None:
+                        if task in backups:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                    failed.add(endpoint)
+                    print(f"端点 {endpoint.url} 请求失败: {last_error}")
+                if not tasks and attempts < self.max_attempts:
+                    hedged = False
+                    launch(failed)
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def summary(self):
+        """返回各端点的请求统计"""
+        lines = []
+        for endpoint in self.endpoints:
+            if endpoint.latencies:
+                latency = (f"p50 {quantile(endpoint.latencies, 0.5):.1f}s, "
+                           f"p95 {quantile(endpoint.latencies, 0.95):.1f}s")
+            else:
+                latency = "无成功请求"
+            lines.append(f"{endpoint.url}: 成功 {endpoint.samples}, 失败 {endpoint.failures}, {latency}")
+        lines.append(f"备份请求 {self.hedges} 次，其中 {self.hedge_wins} 次先于原请求返回")
+        return "\n".join(lines)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
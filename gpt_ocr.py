@@ -5,37 +5,49 @@ import queue
 from pathlib import Path
 from g4f.client import Client
 from tqdm import tqdm
+from ocr_scheduler import OcrScheduler, page_number
+from pdf_splitter import parse_page_range
+
+
+MODEL = "gpt-4o"
+OCR_PROMPT = "只识别图片内容为markdown格式，翻译为中文，不要总结，不要介绍，行内公式用 $ 表示，行间公式用 $$ 表示，公式序号用\\tag表示"
+
+
+def ocr_image(image_path, client, model=MODEL, prompt=OCR_PROMPT):
+    """发送单张图片的OCR请求，返回识别出的Markdown文本"""
+    # 读取并编码图片
+    with open(image_path, "rb") as file:
+        base64_image = base64.b64encode(file.read()).decode("utf-8")
+
+    # 构建请求
+    response = client.chat.completions.create(
+        model=model,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/png;base64,{base64_image}"
+                        },
+                    },
+                    {
+                        "type": "text",
+                        "text": prompt,
+                    },
+                ],
+            }
+        ],
+        web_search=False,
+    )
+    return response.choices[0].message.content
 
 
 def process_image(image_path, output_dir, client, progress_queue=None):
     """处理单个图片文件，发送OCR请求并保存结果"""
     try:
-        # 读取并编码图片
-        with open(image_path, "rb") as file:
-            base64_image = base64.b64encode(file.read()).decode("utf-8")
-
-        # 构建请求
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}"
-                            },
-                        },
-                        {
-                            "type": "text",
-                            "text": "只识别图片内容为markdown格式，翻译为中文，不要总结，不要介绍，行内公式用 $ 表示，行间公式用 $$ 表示，公式序号用\\tag表示",
-                        },
-                    ],
-                }
-            ],
-            web_search=False,
-        )
+        content = ocr_image(image_path, client)
 
         # 保存结果
         image_name = os.path.basename(image_path)
@@ -43,7 +55,7 @@ def process_image(image_path, output_dir, client, progress_queue=None):
         output_path = os.path.join(output_dir, output_name)
 
         with open(output_path, "w", encoding="utf-8") as f:
-            f.write(response.choices[0].message.content)
+            f.write(content)
 
         if progress_queue:
             progress_queue.put(1)  # 通知进度更新
@@ -54,19 +66,24 @@ def process_image(image_path, output_dir, client, progress_queue=None):
         return False, f"处理失败 {image_path}: {str(e)}"
 
 
-def worker(input_queue, output_dir, client, progress_queue=None):
-    """工作线程函数，从队列中获取任务并处理"""
+def worker(scheduler, output_dir, client, progress_queue=None):
+    """工作线程函数，按优先级从调度器中获取任务并处理"""
     while True:
-        image_path = input_queue.get()
-        if image_path is None:  # 结束信号
+        job = scheduler.get()
+        if job is None:  # 调度器已关闭且没有剩余任务
             break
-        success, message = process_image(image_path, output_dir, client, progress_queue)
+        success, message = process_image(job.item, output_dir, client, progress_queue)
         print(message)
-        input_queue.task_done()
+        scheduler.task_done(job, success)
 
 
-def main(input_dir, output_dir, num_threads=4):
-    """主函数，协调多线程处理图片"""
+def main(input_dir, output_dir, num_threads=4, boost_pages=None):
+    """
+    主函数，协调多线程处理图片
+
+    图片按页码（文件名）顺序处理，boost_pages 中的页（从0开始）优先处理。
+    按 Ctrl+C 时取消排队中的图片，等待已开始的请求完成后退出。
+    """
     # 确保输出目录存在
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
@@ -83,17 +100,16 @@ def main(input_dir, output_dir, num_threads=4):
 
     print(f"找到 {len(image_files)} 张图片")
 
-    # 创建工作队列
-    work_queue = queue.Queue()
+    # 按页码排队，文件名不是数字的图片排在最后
+    book = os.path.basename(os.path.normpath(input_dir))
+    scheduler = OcrScheduler()
     progress_queue = queue.Queue()
-
-    # 添加所有图片到队列
     for image_path in image_files:
-        work_queue.put(image_path)
-
-    # 添加结束信号
-    for _ in range(num_threads):
-        work_queue.put(None)
+        page = page_number(image_path)
+        scheduler.submit(book, image_path, order=(page is None, page or 0, image_path), page=page)
+    if boost_pages:
+        scheduler.boost(book, pages=boost_pages)
+    scheduler.close()
 
     # 创建并启动工作线程
     client = Client()  # 每个线程共享同一个客户端实例
@@ -101,18 +117,28 @@ def main(input_dir, output_dir, num_threads=4):
 
     for _ in range(num_threads):
         t = threading.Thread(
-            target=worker, args=(work_queue, output_dir, client, progress_queue)
+            target=worker, args=(scheduler, output_dir, client, progress_queue)
         )
         t.daemon = True
         t.start()
         threads.append(t)
 
     # 显示进度条
+    total = len(image_files)
     processed_count = 0
     success_count = 0
-    with tqdm(total=len(image_files), desc="处理进度") as pbar:
-        while processed_count < len(image_files):
-            result = progress_queue.get()
+    with tqdm(total=total, desc="处理进度") as pbar:
+        while processed_count < total:
+            try:
+                result = progress_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except KeyboardInterrupt:
+                cancelled = scheduler.cancel()
+                total -= cancelled
+                pbar.total = total
+                print(f"\n已取消 {cancelled} 张排队中的图片，等待进行中的请求完成...")
+                continue
             processed_count += 1
             success_count += result
             pbar.update(1)
@@ -121,7 +147,7 @@ def main(input_dir, output_dir, num_threads=4):
     for t in threads:
         t.join()
 
-    print(f"处理完成！成功: {success_count}, 失败: {len(image_files) - success_count}")
+    print(f"处理完成！成功: {success_count}, 失败: {processed_count - success_count}")
 
 
 if __name__ == "__main__":
@@ -131,9 +157,12 @@ if __name__ == "__main__":
     parser.add_argument("--input", "-i", required=True, help="输入图片文件夹路径")
     parser.add_argument("--output", "-o", required=True, help="输出Markdown文件夹路径")
     parser.add_argument("--threads", "-t", type=int, default=4, help="线程数")
+    parser.add_argument("--boost", "-b", help="优先处理的页码范围（从1开始），如 \"1-20,35\"")
 
     args = parser.parse_args()
 
-    main(args.input, args.output, args.threads)
+    boost_pages = parse_page_range(args.boost) if args.boost else None
+    main(args.input, args.output, args.threads, boost_pages)
 
     # python gptocr.py -i input_folder -o output_folder -t 4
+    # python gptocr.py -i input_folder -o output_folder -t 4 -b 1-20
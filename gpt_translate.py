@@ -1,11 +1,119 @@
 import os
+import re
+import json
+import time
 import base64
+import asyncio
+import sqlite3
+import hashlib
 import threading
-import queue
+import unicodedata
+from collections import deque
 from pathlib import Path
-from g4f.client import Client
+from g4f.client import Client, AsyncClient
 from tqdm import tqdm
 
+MODEL = "gpt-4o"
+TRANSLATE_PROMPT = "翻译英文内容为中文markdown格式，不要总结，不要介绍，行内公式用 $ 表示，行间公式用 $$ 表示，公式序号用\\tag表示"
+
+
+def normalize_text(text):
+    """规范化源文本：统一 Unicode 形式并合并空白字符，用作翻译记忆的键"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class TranslationMemory:
+    """
+    基于 SQLite 的持久化翻译记忆
+
+    以（规范化源文本、提示词、模型）的哈希为键保存译文，
+    在发起请求前查询，翻译成功后写入。支持导出/导入 JSON Lines 文件，便于在机器之间共享。
+    """
+
+    def __init__(self, db_path="translation_memory.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS memory (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                model TEXT NOT NULL,
+                target TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(source, prompt=TRANSLATE_PROMPT, model=MODEL):
+        raw = "\x00".join((normalize_text(source), prompt, model))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, source, prompt=TRANSLATE_PROMPT, model=MODEL):
+        """查询译文，未命中时返回 None"""
+        key = self.make_key(source, prompt, model)
+        with self._lock:
+            row = self._conn.execute("SELECT target FROM memory WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, source, target, prompt=TRANSLATE_PROMPT, model=MODEL):
+        """写入（或覆盖）一条译文"""
+        key = self.make_key(source, prompt, model)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memory (key, source, prompt, model, target, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_text(source), prompt, model, target, time.time())
+            )
+            self._conn.commit()
+
+    def export_jsonl(self, output_file):
+        """导出为 JSON Lines，每行一条 {source, prompt, model, target}，返回导出条数"""
+        count = 0
+        with self._lock, open(output_file, 'w', encoding='utf-8') as f:
+            for source, prompt, model, target in self._conn.execute(
+                    "SELECT source, prompt, model, target FROM memory ORDER BY created"):
+                f.write(json.dumps({"source": source, "prompt": prompt, "model": model, "target": target},
+                                   ensure_ascii=False) + "\n")
+                count += 1
+        return count
+
+    def import_jsonl(self, input_file, overwrite=False):
+        """从 JSON Lines 导入，默认不覆盖已有条目，返回导入条数"""
+        verb = "INSERT OR REPLACE" if overwrite else "INSERT OR IGNORE"
+        count = 0
+        with self._lock, open(input_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    item = json.loads(line)
+                    source, prompt, model, target = item["source"], item["prompt"], item["model"], item["target"]
+                except (ValueError, KeyError) as e:
+                    print(f"警告: 跳过无效的记录 ({e}): {line[:80]}")
+                    continue
+                cursor = self._conn.execute(
+                    f"{verb} INTO memory (key, source, prompt, model, target, created) VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.make_key(source, prompt, model), normalize_text(source), prompt, model, target, time.time())
+                )
+                count += cursor.rowcount
+            self._conn.commit()
+        return count
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM memory").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
 def split_markdown_by_paragraphs(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
@@ -21,118 +129,460 @@ def split_markdown_by_paragraphs(file_path):
     paragraphs = [p.strip() for p in paragraphs]
     return [p for p in paragraphs if p]
 
-def translate_markdown_paragraphs(paragraph):
-    print(f"正在翻译段落：{paragraph}")
-    try:
-        client = Client()
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+def build_messages(paragraph):
+    """构建翻译请求的消息体"""
+    return [
+        {
+            "role": "user",
+            "content": [
                 {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": paragraph,
-                        },
-                        {
-                            "type": "text",
-                            "text": "翻译英文内容为中文markdown格式，不要总结，不要介绍，行内公式用 $ 表示，行间公式用 $$ 表示，公式序号用\\tag表示",
-                        },
-                    ],
-                }
+                    "type": "text",
+                    "text": paragraph,
+                },
+                {
+                    "type": "text",
+                    "text": TRANSLATE_PROMPT,
+                },
             ],
-            web_search=False,
-        )
-        return response.choices[0].message.content
+        }
+    ]
+
+
+_shared_client = None
+
+
+def get_client():
+    """返回进程内共享的同步客户端，避免每个段落都新建连接"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = Client()
+    return _shared_client
+
+
+FENCE_PATTERN = re.compile(r'^(```|~~~)')
+MATH_ENV_PATTERN = re.compile(r'^\\begin\{(equation|align|gather|multline|eqnarray|array)\*?\}')
+INLINE_SKIP_PATTERN = re.compile(
+    r'\$\$.+?\$\$|\$[^$]+\$|\\\(.+?\\\)|`[^`]*`|!?\[[^\]]*\]\([^)]*\)|https?://\S+|www\.\S+|<[^>]+>'
+)
+LATIN_WORD_PATTERN = re.compile(r'[A-Za-z]{2,}')
+CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+
+def needs_translation(text, cjk_ratio=0.3):
+    """
+    判断一段文本是否需要发送给模型翻译
+
+    去掉行内公式、行内代码、链接和 URL 后，没有英文单词的文本（纯公式、编号、URL 等）不翻译；
+    中文字符占比超过 cjk_ratio 的文本视为已是中文，也不翻译。
+    """
+    rest = INLINE_SKIP_PATTERN.sub(' ', text)
+    words = LATIN_WORD_PATTERN.findall(rest)
+    if not words:
+        return False
+    cjk = len(CJK_PATTERN.findall(rest))
+    latin = sum(len(word) for word in words)
+    return cjk / (cjk + latin) <= cjk_ratio
+
+
+def find_closing_line(lines, start, marker):
+    """返回 start 之后第一个含有 marker 的行号，找不到时返回 None"""
+    for end in range(start + 1, len(lines)):
+        if marker in lines[end]:
+            return end
+    return None
+
+
+def segment_markdown(content):
+    """
+    按 Markdown 块结构切分文本
+
+    返回 (text, translate) 列表：代码块、行间公式（$$ 与 \\begin{equation} 等环境）
+    整块保留且不翻译；表格整块作为一段，仅在含有英文正文时翻译；其余非空行各为一段，
+    由 needs_translation 决定是否翻译。
+
+    只有公式在开头这一行没有闭合时才向后合并成块；$$a=b$$ 之后还有正文的行按普通行处理，
+    \end{equation} 等之后的正文则与公式分开，单独成段。
+    找不到闭合的代码块或公式时，开头这一行也按普通行处理，不会吞掉文件的其余部分。
+    """
+    lines = content.split('\n')
+    segments = []
+    i = 0
+    while i < len(lines):
+        stripped = lines[i].strip()
+        if not stripped:
+            i += 1
+            continue
+
+        fence = FENCE_PATTERN.match(stripped)
+        if fence:
+            end = i + 1
+            while end < len(lines) and not lines[end].strip().startswith(fence.group(1)):
+                end += 1
+            if end < len(lines):
+                segments.append(('\n'.join(lines[i:end + 1]).strip('\n'), False))
+                i = end + 1
+                continue
+
+        elif stripped.startswith('$$'):
+            close = stripped.find('$$', 2)
+            if close == -1:
+                end = find_closing_line(lines, i, '$$')
+            else:
+                # 同一行内闭合：整行只有公式时保留，后面还有正文时按普通行处理
+                end = i if not stripped[close + 2:].strip() else None
+            if end is not None:
+                segments.append(('\n'.join(line.strip() for line in lines[i:end + 1]), False))
+                i = end + 1
+                continue
+
+        elif MATH_ENV_PATTERN.match(stripped):
+            end_marker = '\\end{' + stripped[len('\\begin{'):stripped.index('}') + 1]
+            end = i if end_marker in stripped else find_closing_line(lines, i, end_marker)
+            if end is not None:
+                block = '\n'.join(line.strip() for line in lines[i:end + 1])
+                # \end{...} 之后同一行还有正文时，公式保留，正文单独成段
+                close = block.rindex(end_marker) + len(end_marker)
+                segments.append((block[:close], False))
+                trailing = block[close:].strip()
+                if trailing:
+                    segments.append((trailing, needs_translation(trailing)))
+                i = end + 1
+                continue
+
+        elif stripped.startswith('|'):
+            end = i
+            while end + 1 < len(lines) and lines[end + 1].strip().startswith('|'):
+                end += 1
+            table = '\n'.join(line.strip() for line in lines[i:end + 1])
+            segments.append((table, needs_translation(table)))
+            i = end + 1
+            continue
+
+        # 未闭合的代码块或公式环境的开头行本身不是正文，原样保留
+        opener = fence or MATH_ENV_PATTERN.fullmatch(stripped)
+        segments.append((stripped, not opener and needs_translation(stripped)))
+        i += 1
+    return segments
+
+
+def split_markdown_segments(file_path):
+    """读取 Markdown 文件并按块结构切分，读取失败时返回空列表"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+    except FileNotFoundError:
+        print(f"错误：未找到文件 '{file_path}'")
+        return []
     except Exception as e:
-        print(e)
-        return translate_markdown_paragraphs(paragraph)
+        print(f"错误：读取文件时发生错误 - {e}")
+        return []
+    return segment_markdown(content)
 
-    
 
-def translation_worker(task_queue, result_queue, progress_bar):
-    while True:
-        task = task_queue.get()
-        if task is None:  # 退出信号
-            break
-        index, paragraph = task
+def translate_markdown_paragraphs(paragraph, memory=None, max_retries=3):
+    """同步翻译单个段落，失败时按指数退避重试，全部失败时返回 None"""
+    if memory is not None:
+        cached = memory.get(paragraph)
+        if cached is not None:
+            return cached
+    print(f"正在翻译段落：{paragraph}")
+    for attempt in range(1, max_retries + 1):
         try:
-            translated = translate_markdown_paragraphs(paragraph)
-            result_queue.put((index, translated))
+            response = get_client().chat.completions.create(
+                model=MODEL,
+                messages=build_messages(paragraph),
+                web_search=False,
+            )
+            translated = response.choices[0].message.content
+            if translated:
+                if memory is not None:
+                    memory.put(paragraph, translated)
+                return translated
+            print(f"段落翻译返回空结果（第 {attempt} 次）")
         except Exception as e:
-            print(f"段落 {index} 翻译失败: {e}")
-            result_queue.put((index, None))
-        finally:
-            progress_bar.update(1)
-            task_queue.task_done()
-
-def process_markdown_file(input_file, output_file, num_threads=4):
-    paragraphs = split_markdown_by_paragraphs(input_file)
-    if not paragraphs:
+            print(f"段落翻译失败（第 {attempt} 次）: {e}")
+        if attempt < max_retries:
+            time.sleep(min(2 ** attempt, 30))
+    return None
+
+
+async def translate_paragraph_async(client, semaphore, paragraph, memory=None, max_retries=3, inflight=None):
+    """
+    异步翻译单个段落，失败时按指数退避重试
+
+    参数:
+        client (AsyncClient): 共享的异步客户端
+        semaphore (asyncio.Semaphore): 限制同时进行的请求数
+        paragraph (str): 待翻译段落
+        memory (TranslationMemory, optional): 翻译记忆
+        max_retries (int): 最大尝试次数，全部失败时返回 None
+        inflight (dict, optional): 进行中的请求 {记忆键: Task}；相同段落（按规范化文本）同时被请求时
+            只发送一次，其余调用等待同一个结果，译文也只写入记忆一次
+    """
+    if memory is not None:
+        cached = memory.get(paragraph)
+        if cached is not None:
+            return cached
+    if inflight is None:
+        return await request_translation(client, semaphore, paragraph, memory, max_retries)
+
+    key = TranslationMemory.make_key(paragraph)
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(request_translation(client, semaphore, paragraph, memory, max_retries))
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+    # shield：某个调用方被取消时不影响其它等待同一结果的调用方
+    return await asyncio.shield(task)
+
+
+async def request_translation(client, semaphore, paragraph, memory=None, max_retries=3):
+    """发送翻译请求并按指数退避重试，成功时写入翻译记忆，全部失败时返回 None"""
+    for attempt in range(1, max_retries + 1):
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model=MODEL,
+                    messages=build_messages(paragraph),
+                    web_search=False,
+                )
+            translated = response.choices[0].message.content
+            if translated:
+                if memory is not None:
+                    memory.put(paragraph, translated)
+                return translated
+            print(f"段落翻译返回空结果（第 {attempt} 次）")
+        except Exception as e:
+            print(f"段落翻译失败（第 {attempt} 次）: {e}")
+        if attempt < max_retries:
+            await asyncio.sleep(min(2 ** attempt, 30))
+    return None
+
+
+async def translate_segments_to_file(client, semaphore, segments, output_file, memory=None,
+                                     progress_bar=None, window=16, inflight=None):
+    """
+    按源顺序流式写出译文
+
+    segments 为 segment_markdown 返回的 (text, translate) 列表，不需要翻译的段落原样写出。
+    最多同时调度 window 个段落，每当最前面的段落完成就立即写入磁盘，
+    因此内存占用只与窗口大小有关。写入过程中结果保存在 output_file + ".part"，
+    所有段落都成功后才替换为 output_file；有段落翻译失败时保留 .part 供检查，不生成 output_file。
+    inflight 为 translate_paragraph_async 的进行中请求表，多个文件同时翻译时共用一个，
+    未指定时只在本文件内合并重复段落。
+    返回 (成功写出的段落数, 失败的段落数)。
+    """
+    inflight = {} if inflight is None else inflight
+    part_file = output_file + ".part"
+    pending = deque()
+    segment_iter = iter(segments)
+    written = 0
+    failed = 0
+
+    def schedule_next():
+        segment = next(segment_iter, None)
+        if segment is None:
+            return
+        text, translate = segment
+        if translate:
+            task = asyncio.ensure_future(translate_paragraph_async(client, semaphore, text, memory,
+                                                                   inflight=inflight))
+        else:
+            task = asyncio.get_running_loop().create_future()
+            task.set_result(text)
+        if progress_bar is not None:
+            task.add_done_callback(lambda _: progress_bar.update(1))
+        pending.append(task)
+
+    try:
+        with open(part_file, 'w', encoding='utf-8') as file:
+            for _ in range(window):
+                schedule_next()
+            while pending:
+                translated = await pending.popleft()
+                schedule_next()
+                if translated is None:
+                    failed += 1
+                    continue
+                if written:
+                    file.write("\n\n")
+                file.write(translated)
+                file.flush()
+                written += 1
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if failed:
+        print(f"警告：'{output_file}' 有 {failed} 个段落翻译失败，未完成的结果保留在 '{part_file}'")
+    elif written:
+        os.replace(part_file, output_file)
+    else:
+        os.remove(part_file)
+    return written, failed
+
+
+async def translate_file_async(input_file, output_file, concurrency=4, memory=None):
+    """使用单个共享异步客户端翻译整个文件，所有段落都翻译成功并写出时返回 True"""
+    segments = split_markdown_segments(input_file)
+    if not segments:
         print(f"警告：文件 '{input_file}' 中没有可处理的段落")
-        return
-    
-    task_queue = queue.Queue()
-    result_queue = queue.Queue()
-    
-    # 初始化进度条
-    with tqdm(total=len(paragraphs), desc="翻译进度") as progress_bar:
-        # 创建并启动工作线程
-        threads = []
-        for _ in range(num_threads):
-            t = threading.Thread(
-                target=translation_worker,
-                args=(task_queue, result_queue, progress_bar),
-                daemon=True
+        return False
+    requests = sum(1 for _, translate in segments if translate)
+    print(f"共 {len(segments)} 个段落，其中 {requests} 个需要翻译，{len(segments) - requests} 个原样保留")
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    with tqdm(total=len(segments), desc="翻译进度") as progress_bar:
+        try:
+            written, failed = await translate_segments_to_file(
+                client, semaphore, segments, output_file, memory, progress_bar, window=concurrency * 4
             )
-            t.start()
-            threads.append(t)
-        
-        # 添加任务到队列
-        for i, para in enumerate(paragraphs):
-            task_queue.put((i, para))
-        
-        # 等待所有任务完成
-        task_queue.join()
-        
-        # 发送退出信号给所有工作线程
-        for _ in range(num_threads):
-            task_queue.put(None)
-        
-        # 等待所有线程结束
-        for t in threads:
-            t.join()
-    
-    # 收集并排序结果
-    results = [None] * len(paragraphs)
-    while not result_queue.empty():
-        index, content = result_queue.get()
-        if content is not None:
-            results[index] = content
-    
-    # 过滤掉失败的翻译
-    translated_content_list = [r for r in results if r is not None]
-    if not translated_content_list:
-        print(f"错误：所有段落翻译均失败，未生成输出文件")
+        except Exception as e:
+            print(f"错误：写入文件 '{output_file}' 时发生错误 - {e}")
+            return False
+
+    if failed:
+        print(f"错误：{failed} 个段落翻译失败，未生成输出文件")
+        return False
+    if not written:
+        print(f"错误：没有写出任何段落，未生成输出文件")
+        return False
+    print(f"成功处理文件 '{input_file}'，结果已保存到 '{output_file}'")
+    return True
+
+
+def process_markdown_file(input_file, output_file, num_threads=4, memory=None):
+    """翻译单个文件，所有段落都成功时返回 True"""
+    return asyncio.run(translate_file_async(input_file, output_file, num_threads, memory))
+
+
+def output_path_for(input_file, suffix=".zh.md"):
+    """源文件 xxx.md 对应的译文路径 xxx.zh.md"""
+    return input_file[:-len(".md")] + suffix
+
+
+def is_translation_complete(input_file, output_file):
+    """
+    判断译文是否为最新且完整：译文存在、不早于源文件，并且没有残留的 .part
+
+    有段落翻译失败时 translate_segments_to_file 只保留 .part 而不生成译文，
+    因此译文文件存在即表示上次翻译全部成功。翻译记忆只用于填充段落，不参与判断。
+    """
+    if not os.path.exists(output_file) or os.path.exists(output_file + ".part"):
+        return False
+    return os.path.getmtime(output_file) >= os.path.getmtime(input_file)
+
+
+def collect_translation_jobs(input_dir, suffix=".zh.md", force=False):
+    """
+    收集目录中需要翻译的文件
+
+    返回 (jobs, skipped)，jobs 为 (input_file, output_file) 列表；
+    译文已是最新且完整（is_translation_complete）时计入 skipped（force=True 时全部重译）。
+    """
+    jobs = []
+    skipped = 0
+    for fp in sorted(os.listdir(input_dir)):
+        if not fp.endswith(".md") or fp.endswith(suffix):
+            continue
+        input_file = os.path.join(input_dir, fp)
+        if not os.path.isfile(input_file):
+            continue
+        output_file = output_path_for(input_file, suffix)
+        if not force and is_translation_complete(input_file, output_file):
+            skipped += 1
+            continue
+        jobs.append((input_file, output_file))
+    return jobs, skipped
+
+
+async def translate_directory_async(input_dir, concurrency=4, memory=None, force=False, max_open_files=None):
+    """
+    跨文件调度翻译整个目录
+
+    所有文件共享一个异步客户端和一个全局并发限制，不同文件的段落交错执行，
+    避免逐个文件处理时线程池空闲和每个文件末尾的长尾等待。每个文件仍按源顺序流式写出。
+    """
+    jobs, skipped = collect_translation_jobs(input_dir, force=force)
+    if skipped:
+        print(f"跳过 {skipped} 个译文已是最新的文件")
+    if not jobs:
+        print("没有需要翻译的文件")
         return
-    
-    translated_content = "\n\n".join(translated_content_list)
-    
-    try:
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(translated_content)
-        print(f"成功处理文件 '{input_file}'，结果已保存到 '{output_file}'")
-    except Exception as e:
-        print(f"错误：写入文件 '{output_file}' 时发生错误 - {e}")
+
+    file_segments = [(input_file, output_file, split_markdown_segments(input_file))
+                     for input_file, output_file in jobs]
+    total = sum(len(segments) for _, _, segments in file_segments)
+    requests = sum(1 for _, _, segments in file_segments for _, translate in segments if translate)
+    print(f"共 {len(jobs)} 个文件，{total} 个段落，其中 {requests} 个需要翻译，{total - requests} 个原样保留")
+
+    client = AsyncClient()
+    request_semaphore = asyncio.Semaphore(concurrency)
+    file_semaphore = asyncio.Semaphore(max_open_files or concurrency * 2)
+    inflight = {}  # 所有文件共用，不同文件中的相同段落只请求一次
+    results = {"done": 0, "failed": 0}
+
+    async def run_file(input_file, output_file, segments, progress_bar):
+        if not segments:
+            print(f"警告：文件 '{input_file}' 中没有可处理的段落")
+            results["failed"] += 1
+            return
+        async with file_semaphore:
+            try:
+                written, failed = await translate_segments_to_file(
+                    client, request_semaphore, segments, output_file, memory, progress_bar,
+                    window=concurrency * 2, inflight=inflight
+                )
+            except Exception as e:
+                print(f"错误：处理文件 '{input_file}' 时发生错误 - {e}")
+                written, failed = 0, 1
+        results["done" if written and not failed else "failed"] += 1
+        progress_bar.set_postfix(files=f"{results['done'] + results['failed']}/{len(jobs)}")
+
+    with tqdm(total=total, desc="批量翻译进度") as progress_bar:
+        await asyncio.gather(*(run_file(input_file, output_file, segments, progress_bar)
+                               for input_file, output_file, segments in file_segments))
+
+    print(f"批量翻译完成！成功: {results['done']}, 失败: {results['failed']}, 跳过: {skipped}")
+
+
+def process_markdown_directory(input_dir, num_threads=4, memory=None, force=False):
+    asyncio.run(translate_directory_async(input_dir, num_threads, memory, force))
 
 if __name__ == "__main__":
-    for fp in os.listdir(r"D:\project\QCDReview\50 years of QCD"):
-        input_file = os.path.join(r"D:\project\QCDReview\50 years of QCD", fp)
-        output_file = os.path.join(r"D:\project\QCDReview\50 years of QCD", fp).replace(".md", ".zh.md")
-        num_threads = 4  # 默认使用4个线程，可以根据需要调整
-        
-        if not os.path.exists(input_file):
-            print(f"错误：输入文件 '{input_file}' 不存在")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="异步Markdown翻译工具")
+    parser.add_argument("input", nargs="?", default=r"D:\project\QCDReview\50 years of QCD", help="输入Markdown文件或文件夹路径")
+    parser.add_argument("--threads", "-t", type=int, default=4, help="并发请求数")
+    parser.add_argument("--memory", "-m", default="translation_memory.db", help="翻译记忆数据库路径")
+    parser.add_argument("--no-memory", action="store_true", help="不使用翻译记忆")
+    parser.add_argument("--export-memory", help="将翻译记忆导出到指定的 JSON Lines 文件后退出")
+    parser.add_argument("--import-memory", help="从指定的 JSON Lines 文件导入翻译记忆后退出")
+    parser.add_argument("--force", "-f", action="store_true", help="即使译文已是最新也重新翻译")
+    args = parser.parse_args()
+    # python gpt_translate.py "D:\project\QCDReview\50 years of QCD" -t 4 -m translation_memory.db
+
+    memory = None if args.no_memory else TranslationMemory(args.memory)
+
+    if args.export_memory or args.import_memory:
+        if memory is None:
+            print("错误: --no-memory 不能与导入/导出同时使用")
         else:
-            process_markdown_file(input_file, output_file, num_threads)    
\ No newline at end of file
+            if args.import_memory:
+                print(f"已导入 {memory.import_jsonl(args.import_memory)} 条翻译记忆")
+            if args.export_memory:
+                print(f"已导出 {memory.export_jsonl(args.export_memory)} 条翻译记忆到 '{args.export_memory}'")
+            memory.close()
+        raise SystemExit(0)
+
+    if os.path.isdir(args.input):
+        process_markdown_directory(args.input, args.threads, memory, args.force)
+    elif os.path.isfile(args.input):
+        process_markdown_file(args.input, output_path_for(args.input), args.threads, memory)
+    else:
+        print(f"错误：输入路径 '{args.input}' 不存在")
+
+    if memory is not None:
+        memory.close()
@@ -0,0 +1,230 @@
+import os
+import re
+import time
+import sqlite3
+import argparse
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    book TEXT,
+    outline_path TEXT,
+    page INTEGER,
+    kind TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_docs_book ON docs(book, page);
+"""
+
+
+def fts_tokenizer(conn):
+    """
+    选择全文索引分词器
+
+    trigram 分词器（SQLite 3.34+）按三字符切分，中文和公式片段都能做子串匹配；
+    旧版本 SQLite 退回 unicode61，此时中文查询依赖 LIKE 兜底。
+    """
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.tokenizer_probe USING fts5(x, tokenize='trigram')")
+        conn.execute("DROP TABLE temp.tokenizer_probe")
+        return "trigram"
+    except sqlite3.OperationalError:
+        return "unicode61"
+
+
+def describe_path(root, path):
+    """
+    将 Markdown 路径映射为 (书名, 大纲路径, 页码, 类型)
+
+    目录结构与 pdf2png.save_pngs 一致：<root>/<书名>/<大纲各级标题>/<页码>.md，
+    以 .zh.md 结尾的是翻译结果，其余为 OCR 结果。文件名不是数字时页码为 None。
+    """
+    parts = os.path.relpath(path, root).split(os.sep)
+    name = parts[-1]
+    if name.endswith(".zh.md"):
+        kind, stem = "translation", name[:-len(".zh.md")]
+    else:
+        kind, stem = "ocr", name[:-len(".md")]
+    book = parts[0] if len(parts) > 1 else None
+    outline_path = "/".join(parts[1:-1])
+    page = int(stem) if stem.isdigit() else None
+    return book, outline_path, page, kind
+
+
+def scan_markdown(root):
+    """用 os.scandir 迭代遍历目录，返回 {路径: (修改时间, 大小)}"""
+    found = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".md"):
+                        try:
+                            stat = entry.stat()
+                        except OSError as e:
+                            print(f"无法读取 {entry.path}: {e}")
+                            continue
+                        found[os.path.abspath(entry.path)] = (stat.st_mtime, stat.st_size)
+        except PermissionError:
+            print(f"没有权限访问 {directory}")
+    return found
+
+
+class MarkdownSearchIndex:
+    """OCR 与翻译 Markdown 输出的增量全文索引（SQLite FTS5）"""
+
+    def __init__(self, db_path="md_search.db"):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'docs_fts'").fetchone()
+        if row:
+            self.tokenizer = "trigram" if "trigram" in row[0] else "unicode61"
+        else:
+            self.tokenizer = fts_tokenizer(self.conn)
+            self.conn.execute(f"CREATE VIRTUAL TABLE docs_fts USING fts5(body, tokenize='{self.tokenizer}')")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def update(self, root):
+        """
+        增量更新索引：只重新读取修改时间或大小变化的文件，删除已不存在的文件
+
+        返回 (新增或更新数, 跳过数, 删除数)。
+        """
+        root = os.path.abspath(root)
+        prefix = os.path.join(root, '')
+        found = scan_markdown(root)
+        known = {path: (doc_id, mtime, size) for doc_id, path, mtime, size in self.conn.execute(
+            "SELECT id, path, mtime, size FROM docs WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+
+        removed = [doc_id for path, (doc_id, _, _) in known.items() if path not in found]
+        updated = 0
+        with self.conn:
+            self.conn.executemany("DELETE FROM docs WHERE id = ?", [(doc_id,) for doc_id in removed])
+            self.conn.executemany("DELETE FROM docs_fts WHERE rowid = ?", [(doc_id,) for doc_id in removed])
+
+            for path, (mtime, size) in found.items():
+                if path in known and known[path][1:] == (mtime, size):
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        body = f.read()
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"警告: 读取 {path} 失败，已跳过: {e}")
+                    continue
+                book, outline_path, page, kind = describe_path(root, path)
+                if path in known:
+                    doc_id = known[path][0]
+                    self.conn.execute(
+                        "UPDATE docs SET mtime = ?, size = ?, book = ?, outline_path = ?, page = ?, kind = ? WHERE id = ?",
+                        (mtime, size, book, outline_path, page, kind, doc_id))
+                    self.conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (doc_id,))
+                else:
+                    doc_id = self.conn.execute(
+                        "INSERT INTO docs (path, mtime, size, book, outline_path, page, kind) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (path, mtime, size, book, outline_path, page, kind)).lastrowid
+                self.conn.execute("INSERT INTO docs_fts (rowid, body) VALUES (?, ?)", (doc_id, body))
+                updated += 1
+        return updated, len(found) - updated, len(removed)
+
+    def search(self, query, limit=20, kind=None, book=None):
+        """
+        搜索关键词，多个关键词（空格分隔）需同时出现
+
+        返回 [(书名, 大纲路径, 页码, 类型, 路径, 摘要), ...]。trigram 分词器下不足三个字符的关键词
+        （如两个汉字）无法走索引，改用 LIKE 匹配。
+        """
+        terms = query.split()
+        if not terms:
+            return []
+        min_length = 3 if self.tokenizer == "trigram" else 1
+        match_terms = [term for term in terms if len(term) >= min_length
+                       and (self.tokenizer == "trigram" or term.isascii())]
+        like_terms = [term for term in terms if term not in match_terms]
+
+        conditions, params = [], []
+        if match_terms:
+            conditions.append("docs_fts MATCH ?")
+            params.append(" ".join('"' + term.replace('"', '""') + '"' for term in match_terms))
+        for term in like_terms:
+            conditions.append("docs_fts.body LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([%_\\\\])', r'\\\1', term) + '%')
+        if kind:
+            conditions.append("docs.kind = ?")
+            params.append(kind)
+        if book:
+            conditions.append("docs.book = ?")
+            params.append(book)
+        order = "bm25(docs_fts)" if match_terms else "docs.book, docs.page"
+        sql = (f"SELECT docs.book, docs.outline_path, docs.page, docs.kind, docs.path, docs_fts.body "
+               f"FROM docs_fts JOIN docs ON docs.id = docs_fts.rowid "
+               f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?")
+        params.append(limit)
+        return [(book, outline_path, page, kind, path, make_snippet(body, terms[0]))
+                for book, outline_path, page, kind, path, body in self.conn.execute(sql, params)]
+
+
+def make_snippet(body, term, width=40):
+    """截取关键词附近的文本作为摘要"""
+    position = body.lower().find(term.lower())
+    if position < 0:
+        return body[:width * 2].replace("\n", " ")
+    start = max(position - width, 0)
+    end = position + len(term) + width
+    snippet = body[start:end].replace("\n", " ")
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(body) else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR/翻译 Markdown 全文检索工具')
+    parser.add_argument('query', nargs='?', help='搜索关键词，多个关键词用空格分隔')
+    parser.add_argument('--db', default='md_search.db', help='索引数据库路径，默认为 md_search.db')
+    parser.add_argument('--index', help='增量索引指定的输出目录')
+    parser.add_argument('--kind', choices=['ocr', 'translation'], help='只搜索 OCR 或翻译结果')
+    parser.add_argument('--book', help='只搜索指定的书')
+    parser.add_argument('-n', '--limit', type=int, default=20, help='最多显示的结果数，默认为 20')
+    # python md_search.py --index D:\output
+    # python md_search.py "渐近自由" --kind translation
+    args = parser.parse_args()
+
+    if not (args.index or args.query):
+        parser.print_help()
+        return
+
+    with MarkdownSearchIndex(args.db) as index:
+        if args.index:
+            if not os.path.isdir(args.index):
+                print(f"错误: 目录 '{args.index}' 不存在")
+                return
+            start_time = time.time()
+            updated, skipped, removed = index.update(args.index)
+            print(f"索引完成: 更新 {updated}, 未变 {skipped}, 删除 {removed}, 耗时 {time.time() - start_time:.2f} 秒")
+
+        if args.query:
+            start_time = time.time()
+            results = index.search(args.query, args.limit, args.kind, args.book)
+            for book, outline_path, page, kind, path, snippet in results:
+                page_label = f"第 {page} 页" if page is not None else os.path.basename(path)
+                print(f"[{kind}] {book} / {outline_path} / {page_label}")
+                print(f"    {snippet}")
+            print(f"共 {len(results)} 条结果，耗时 {(time.time() - start_time) * 1000:.1f} 毫秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import re
+import argparse
+import fitz  # PyMuPDF库，用于PDF处理
+from tree2dir import long_path
+
+# 公式内字符占全文的比例超过该值时视为公式密集页，低分辨率下上下标和符号容易识别错
+MAX_MATH_DENSITY = 0.3
+# 每单位墨迹覆盖率至少应识别出的字符数。正文页约为 40000 至 65000（英文，字号越小越高），
+# 译为中文后约减半；低于该值说明有大段内容漏识别
+MIN_CHARS_PER_INK = 6000
+# 墨迹覆盖率低于该值的页视为空白页，不检查长度
+MIN_INK = 0.005
+# 灰度低于该值的像素计为墨迹
+INK_THRESHOLD = 128
+LIGHT_BYTES = bytes(range(INK_THRESHOLD, 256))
+
+MATH_PATTERN = re.compile(r'\$\$.*?\$\$|\$[^$\n]+\$', re.DOTALL)
+
+
+def ink_coverage(pix):
+    """返回渲染页面中墨迹像素所占比例（0 到 1）"""
+    if pix.colorspace is None or pix.colorspace.n != 1 or pix.alpha:
+        pix = fitz.Pixmap(fitz.csGRAY, pix)
+    samples = pix.samples
+    if not samples:
+        return 0.0
+    # 删掉浅色像素，剩下的就是墨迹，计数在 C 中完成
+    return len(samples.translate(None, LIGHT_BYTES)) / len(samples)
+
+
+def file_ink_coverage(png_path):
+    return ink_coverage(fitz.Pixmap(long_path(png_path)))
+
+
+def math_density(text):
+    """返回 $...$ 和 $$...$$ 公式内的字符占全文的比例"""
+    text = text.replace('\\$', '')
+    if not text.strip():
+        return 0.0
+    return sum(len(match) for match in MATH_PATTERN.findall(text)) / len(text)
+
+
+def unbalanced_math(text):
+    """公式定界符 $ 或 $$ 不成对，通常是公式被截断或识别错"""
+    text = text.replace('\\$', '')
+    if text.count('$$') % 2:
+        return True
+    return text.replace('$$', '').count('$') % 2 == 1
+
+
+def assess_ocr(text, ink):
+    """
+    检查 OCR 结果的质量，返回问题列表，为空表示结果可以接受
+
+    ink 为页面的墨迹覆盖率（ink_coverage）。依次检查：公式定界符是否成对、公式密度是否过高、
+    识别出的文字相对墨迹量是否过短。
+    """
+    reasons = []
+    if unbalanced_math(text):
+        reasons.append("公式定界符不成对")
+    density = math_density(text)
+    if density > MAX_MATH_DENSITY:
+        reasons.append(f"公式密集 ({density:.0%})")
+    length = len(text.strip())
+    if ink >= MIN_INK and length < ink * MIN_CHARS_PER_INK:
+        reasons.append(f"结果过短 ({length} 字符，墨迹 {ink:.1%})")
+    return reasons
+
+
+def scan_directory(input_dir):
+    """检查目录（pdf2png / png2md 的输出）中每对 <页码>.png 和 <页码>.md，返回 [(png 路径, 问题列表)]"""
+    flagged = []
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(".png"):
+                continue
+            png_path = os.path.join(root, name)
+            md_path = os.path.splitext(png_path)[0] + ".md"
+            if not os.path.exists(long_path(md_path)):
+                continue
+            with open(long_path(md_path), 'r', encoding='utf-8') as f:
+                text = f.read()
+            reasons = assess_ocr(text, file_ink_coverage(png_path))
+            if reasons:
+                flagged.append((png_path, reasons))
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检查 OCR 结果质量，列出需要以更高分辨率重新识别的页')
+    parser.add_argument('input_dir', help='包含 <页码>.png 和 <页码>.md 的目录')
+    # python ocr_quality.py D:\output\book
+    args = parser.parse_args()
+
+    flagged = scan_directory(args.input_dir)
+    for png_path, reasons in flagged:
+        print(f"{png_path}: {'; '.join(reasons)}")
+    print(f"共 {len(flagged)} 页结果不佳")
+
+
+if __name__ == "__main__":
+    main()
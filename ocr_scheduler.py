@@ -0,0 +1,182 @@
+import os
+import heapq
+import itertools
+import threading
+
+
+def page_number(path):
+    """从 <页码>.png 形式的文件名中取出页码（从0开始），不是数字时返回 None"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return int(stem) if stem.isdigit() else None
+
+
+class OcrJob:
+    """调度器中的一个 OCR 任务"""
+
+    __slots__ = ("id", "book", "chapter", "page", "order", "item", "boost", "state", "version")
+
+    def __init__(self, job_id, book, chapter, page, order, item):
+        self.id = job_id
+        self.book = book
+        self.chapter = chapter
+        self.page = page
+        self.order = order
+        self.item = item
+        self.boost = 0
+        self.state = "queued"  # queued / running / done / failed / cancelled
+        self.version = 0
+
+    def priority(self):
+        return (-self.boost, self.order, self.id)
+
+    def __repr__(self):
+        return f"OcrJob({self.book!r}, {self.chapter!r}, {self.page}, {self.state})"
+
+
+class OcrScheduler:
+    """
+    线程安全的 OCR 任务优先级调度器
+
+    同一本书内按大纲顺序（order，通常为页码）处理，前面的章节先完成；boost() 可以提前指定的章节或页。
+    多本书共用一组工作线程时轮流取任务，每本书都能持续推进；提升过优先级的任务优先于其它书的普通任务。
+    cancel() 取消还在排队的任务。每个章节的任务全部完成时调用 on_chapter_done(book, chapter)，
+    全部成功的章节可以先行使用。
+
+    每本书一个堆，优先级变化时压入新条目，旧条目在弹出时按版本号丢弃（惰性删除）；
+    取任务只需比较各书的堆顶，为 O(书数 + log n)。
+    """
+
+    def __init__(self, on_chapter_done=None):
+        self._lock = threading.Condition()
+        self._heaps = {}        # 书名 -> [(优先级, 版本, 任务)]
+        self._last_served = {}  # 书名 -> 最近一次被取任务的序号，用于轮转
+        self._jobs = {}
+        self._remaining = {}    # (书名, 章节) -> 未结束的任务数
+        self._incomplete = set()  # 有任务失败或被取消的 (书名, 章节)
+        self._ids = itertools.count()
+        self._ticks = itertools.count()
+        self._closed = False
+        self.on_chapter_done = on_chapter_done
+
+    def submit(self, book, item, order=None, chapter="", page=None):
+        """加入一个任务，order 默认为页码；返回 OcrJob"""
+        with self._lock:
+            job_id = next(self._ids)
+            if order is None:
+                order = page if page is not None else job_id
+            job = OcrJob(job_id, book, chapter, page, order, item)
+            self._jobs[job_id] = job
+            self._remaining[book, chapter] = self._remaining.get((book, chapter), 0) + 1
+            self._last_served.setdefault(book, -1)
+            self._push(job)
+            self._lock.notify()
+            return job
+
+    def _push(self, job):
+        job.version += 1
+        heapq.heappush(self._heaps.setdefault(job.book, []), (job.priority(), job.version, job))
+
+    def _head(self, book):
+        """返回该书优先级最高的排队任务，顺便丢弃过期的堆条目"""
+        heap = self._heaps.get(book)
+        while heap:
+            _, version, job = heap[0]
+            if job.state == "queued" and version == job.version:
+                return job
+            heapq.heappop(heap)
+        return None
+
+    def _select(self, book, chapter, pages):
+        for job in self._jobs.values():
+            if job.state != "queued":
+                continue
+            if book is not None and job.book != book:
+                continue
+            if chapter is not None and not (job.chapter == chapter or job.chapter.startswith(chapter + os.sep)):
+                continue
+            if pages is not None and job.page not in pages:
+                continue
+            yield job
+
+    def boost(self, book=None, chapter=None, pages=None, amount=1):
+        """
+        提升排队任务的优先级，返回受影响的任务数
+
+        chapter 为相对书根目录的大纲路径，同时匹配其下的子章节；pages 为页码集合（从0开始）。
+        """
+        pages = set(pages) if pages is not None else None
+        with self._lock:
+            count = 0
+            for job in list(self._select(book, chapter, pages)):
+                job.boost += amount
+                self._push(job)
+                count += 1
+            return count
+
+    def cancel(self, book=None, chapter=None, pages=None):
+        """取消排队中的任务（不影响已开始的任务），不指定条件时取消全部，返回取消的任务数"""
+        pages = set(pages) if pages is not None else None
+        with self._lock:
+            cancelled = list(self._select(book, chapter, pages))
+            for job in cancelled:
+                job.state = "cancelled"
+                self._finish(job)
+            self._lock.notify_all()
+            return len(cancelled)
+
+    def get(self, block=True, timeout=None):
+        """
+        取出下一个任务并标记为运行中
+
+        先选提升幅度最大的书，相同时选最久没有被取过任务的书。没有任务时：block=False 立即返回 None；
+        否则等待新任务，调度器已关闭（close）时返回 None。
+        """
+        with self._lock:
+            while True:
+                best = None
+                for book in self._heaps:
+                    job = self._head(book)
+                    if job is None:
+                        continue
+                    rank = (-job.boost, self._last_served[book])
+                    if best is None or rank < best[0]:
+                        best = (rank, job)
+                if best is not None:
+                    job = best[1]
+                    heapq.heappop(self._heaps[job.book])
+                    job.state = "running"
+                    self._last_served[job.book] = next(self._ticks)
+                    return job
+                if not block or self._closed:
+                    return None
+                if not self._lock.wait(timeout):
+                    return None
+
+    def task_done(self, job, success=True):
+        """标记任务结束；失败的任务可以重新 submit"""
+        with self._lock:
+            job.state = "done" if success else "failed"
+            self._finish(job)
+
+    def _finish(self, job):
+        key = (job.book, job.chapter)
+        self._remaining[key] -= 1
+        del self._jobs[job.id]
+        if job.state != "done":
+            self._incomplete.add(key)
+        if self._remaining[key] == 0:
+            del self._remaining[key]
+            if key not in self._incomplete and self.on_chapter_done:
+                self.on_chapter_done(job.book, job.chapter)
+            self._incomplete.discard(key)
+
+    def close(self):
+        """不再提交新任务；队列取空后 get() 返回 None"""
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+
+    def pending(self):
+        """排队中的任务数"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.state == "queued")
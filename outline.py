@@ -0,0 +1,196 @@
+import json
+from array import array
+from bisect import bisect_right
+
+INDENT = "  "  # 书签文本中每一级的缩进
+
+
+def quote_title(title):
+    """
+    书签文本中的标题写法：首尾有空白、含换行或以双引号开头的标题写成 JSON 字符串，否则原样写出
+
+    否则标题开头的空格会被当作缩进，首尾空白在解析时被去掉，换行会把一个条目拆成两行。
+    """
+    if title != title.strip() or '\n' in title or '\r' in title or title.startswith('"'):
+        return json.dumps(title, ensure_ascii=False)
+    return title
+
+
+def unquote_title(text):
+    """quote_title 的逆操作；不是合法 JSON 字符串的文本去掉首尾空白后原样返回"""
+    text = text.strip()
+    if len(text) >= 2 and text.startswith('"') and text.endswith('"'):
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+    return text
+
+
+class Outline:
+    """
+    文档大纲（书签）的紧凑表示
+
+    条目按文档顺序存放在三个并列数组中：levels（从1开始）、titles、pages（从1开始，与 fitz 的 get_toc 一致）。
+    构造时一次性预计算每个条目的父条目、自身页范围和连同子条目的页范围，以及按起始页排序的索引，
+    按页码查找所属章节只需一次二分查找。
+
+    页范围均为从1开始的闭区间 (first, last)，对应从0开始的半开区间 [first - 1, last)；
+    与下一个条目在同一页开始时 last = first - 1，表示没有自身页。
+    """
+
+    __slots__ = ("levels", "titles", "pages", "num_pages", "parents", "ends", "span_ends",
+                 "_sorted_pages", "_sorted_index")
+
+    def __init__(self, entries=(), num_pages=None):
+        self.levels = array('i')
+        self.titles = []
+        self.pages = array('i')
+        for level, title, page in entries:
+            self.levels.append(level)
+            self.titles.append(title)
+            self.pages.append(page)
+        self.num_pages = num_pages if num_pages is not None else max(self.pages, default=0)
+        self._index()
+
+    def _index(self):
+        count = len(self.titles)
+        levels, pages = self.levels, self.pages
+        self.parents = array('i', [-1]) * count
+        self.ends = array('i', [0]) * count
+        self.span_ends = array('i', [0]) * count
+
+        stack = []
+        for i in range(count):
+            start = pages[i]
+            next_start = pages[i + 1] if i + 1 < count else self.num_pages + 1
+            self.ends[i] = max(next_start - 1, start - 1)
+            # 遇到同级或更高级的条目时，栈中的条目（及其子条目）到此结束
+            while stack and levels[stack[-1]] >= levels[i]:
+                closed = stack.pop()
+                self.span_ends[closed] = max(start - 1, self.ends[closed])
+            self.parents[i] = stack[-1] if stack else -1
+            stack.append(i)
+        for closed in stack:
+            self.span_ends[closed] = max(self.num_pages, self.ends[closed])
+
+        order = sorted(range(count), key=lambda i: (pages[i], i))
+        self._sorted_pages = array('i', (pages[i] for i in order))
+        self._sorted_index = array('i', order)
+
+    @classmethod
+    def from_toc(cls, toc, num_pages=None):
+        """从 fitz 的 get_toc() 结果 [[level, title, page], ...] 构造"""
+        return cls(((entry[0], entry[1], entry[2]) for entry in toc), num_pages)
+
+    @classmethod
+    def from_nested(cls, items, num_pages=None, page_offset=1):
+        """
+        从嵌套结构 [{"title", "page", "down": [...]}, ...] 构造
+
+        pdf2png.walk_outline 生成的页码从0开始，因此默认加 1 转换为 TOC 约定。
+        """
+        entries = []
+        stack = [(iter(items), 1)]
+        while stack:
+            siblings, level = stack[-1]
+            item = next(siblings, None)
+            if item is None:
+                stack.pop()
+                continue
+            entries.append((level, item["title"], item["page"] + page_offset))
+            if item.get("down"):
+                stack.append((iter(item["down"]), level + 1))
+        return cls(entries, num_pages)
+
+    @classmethod
+    def parse(cls, text, strict=True, num_pages=None):
+        """
+        解析书签文本，每行格式为 "标题@页码"，两个空格为一级缩进，标题可以是 JSON 字符串（见 quote_title）
+
+        strict=True 时跳过没有有效页码的行并给出警告；strict=False 时不检查页码，
+        标题为第一个 @ 之前的文本，页码无效时记为 0（如 tree2dir 只需要标题和层级）。
+        """
+        entries = []
+        for line in text.splitlines():
+            line = line.rstrip()
+            content = line.lstrip()
+            if not content:
+                continue
+            level = (len(line) - len(content)) // len(INDENT) + 1
+
+            title, sep, page = content.rpartition('@')
+            valid = sep and page.strip().lstrip('-').isdigit()
+            if not strict:
+                if not content.startswith('"'):
+                    title = content.split('@', 1)[0]
+                elif not valid:
+                    title = content
+                entries.append((level, unquote_title(title), int(page) if valid else 0))
+            elif valid:
+                entries.append((level, unquote_title(title), int(page)))
+            elif sep:
+                print(f"警告: 无效的页码 '{page}'，跳过这一行: {content}")
+            else:
+                print(f"警告: 格式不正确，跳过这一行: {content}")
+        return cls(entries, num_pages)
+
+    @classmethod
+    def load(cls, file_path, strict=True, num_pages=None):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return cls.parse(f.read(), strict, num_pages)
+
+    def dumps(self):
+        """序列化为书签文本，与 parse 互逆"""
+        return "".join(f"{INDENT * (level - 1)}{quote_title(title)}@{page}\n" for level, title, page in self)
+
+    def save(self, file_path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(self.dumps())
+
+    def to_toc(self):
+        """转换为 fitz 的 set_toc() 所需的 [[level, title, page], ...]"""
+        return [[level, title, page] for level, title, page in self]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __iter__(self):
+        return zip(self.levels, self.titles, self.pages)
+
+    def __getitem__(self, index):
+        return self.levels[index], self.titles[index], self.pages[index]
+
+    def __repr__(self):
+        return f"Outline({len(self)} 个条目, {self.num_pages} 页)"
+
+    def own_range(self, index):
+        """条目自身的页范围（到下一个任意级别的条目之前），从1开始的闭区间"""
+        return self.pages[index], self.ends[index]
+
+    def span_range(self, index):
+        """条目连同全部子条目的页范围（到下一个同级或更高级的条目之前），从1开始的闭区间"""
+        return self.pages[index], self.span_ends[index]
+
+    def section_for_page(self, page):
+        """返回包含该页（从1开始）的最深一级条目的下标，位于第一个条目之前时返回 -1"""
+        position = bisect_right(self._sorted_pages, page) - 1
+        return self._sorted_index[position] if position >= 0 else -1
+
+    def ancestors(self, index):
+        """返回从根到该条目（含）的下标列表"""
+        chain = []
+        while index >= 0:
+            chain.append(index)
+            index = self.parents[index]
+        chain.reverse()
+        return chain
+
+    def paths(self, transform=None):
+        """返回每个条目从根开始的标题路径元组，transform 用于处理每一级标题（如清理文件名）"""
+        result = []
+        for index, title in enumerate(self.titles):
+            name = transform(title) if transform else title
+            parent = self.parents[index]
+            result.append((result[parent] if parent >= 0 else ()) + (name,))
+        return result
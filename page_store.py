@@ -0,0 +1,196 @@
+import os
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from outline import Outline
+from pdf2png import format_filename
+from tree2dir import long_path
+
+# 内容类型及导出为目录结构时的文件扩展名，与 pdf2png / png2md / gpt_translate 的输出一致
+KINDS = {"png": ".png", "ocr": ".md", "translation": ".zh.md"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    book TEXT PRIMARY KEY,
+    pages INTEGER NOT NULL,
+    outline TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    data BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_page ON entries(book, kind, page, id);
+"""
+
+
+class PageStore:
+    """
+    单文件页面仓库：在一个 SQLite 文件中保存渲染的页面、OCR 结果和译文，以 (书名, 页码, 类型) 为键
+
+    代替 pdf2png / png2md 生成的大量小文件，避免创建、stat 和列目录的元数据开销。
+    页码从0开始，与目录结构中的 <页码>.png 一致。写入只追加新记录（同一个键以最新的一条为准），
+    WAL 模式下多个线程或进程可以同时写入；compact() 删除被覆盖的旧记录。
+    export() 可随时导出为原来的目录结构。
+    """
+
+    def __init__(self, db_path="pages.db"):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def put_book(self, book, outline, num_pages):
+        """记录书的大纲（Outline）和页数，导出时据此还原目录结构"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO books (book, pages, outline, updated) VALUES (?, ?, ?, ?)",
+                               (book, num_pages, outline.dumps(), time.time()))
+            self._conn.commit()
+
+    def book_outline(self, book):
+        with self._lock:
+            row = self._conn.execute("SELECT outline, pages FROM books WHERE book = ?", (book,)).fetchone()
+        if row is None:
+            return None
+        return Outline.parse(row[0], num_pages=row[1])
+
+    def books(self):
+        with self._lock:
+            return [book for book, in self._conn.execute("SELECT book FROM books ORDER BY book")]
+
+    def put(self, book, page, kind, data):
+        """追加一条记录，data 为 bytes 或 str（按 UTF-8 保存）"""
+        if kind not in KINDS:
+            raise ValueError(f"未知的类型: {kind}")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (book, page, kind, sha256, data, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (book, page, kind, hashlib.sha256(data).hexdigest(), sqlite3.Binary(data), time.time())
+            )
+            self._conn.commit()
+
+    def get(self, book, page, kind):
+        """读取最新的一条记录，不存在时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM entries WHERE book = ? AND kind = ? AND page = ? ORDER BY id DESC LIMIT 1",
+                (book, kind, page)).fetchone()
+        return bytes(row[0]) if row else None
+
+    def get_text(self, book, page, kind):
+        data = self.get(book, page, kind)
+        return data.decode("utf-8") if data is not None else None
+
+    def pages(self, book, kind):
+        """返回已有该类型内容的页码（升序）"""
+        with self._lock:
+            return [page for page, in self._conn.execute(
+                "SELECT DISTINCT page FROM entries WHERE book = ? AND kind = ? ORDER BY page", (book, kind))]
+
+    def missing(self, book, kind, source_kind="png"):
+        """返回有 source_kind 但还没有 kind 的页码，即下一步待处理的页"""
+        done = set(self.pages(book, kind))
+        return [page for page in self.pages(book, source_kind) if page not in done]
+
+    def export(self, output_dir, books=None, kinds=None):
+        """
+        导出为目录结构 <output_dir>/<书名>/<大纲路径>/<页码>.<扩展名>，返回写出的文件数
+
+        每页放在其所属大纲条目的目录中（与 pdf2png.save_pngs 相同），不属于任何条目的页放在书的根目录中。
+        """
+        written = 0
+        kinds = kinds or list(KINDS)
+        for book in books or self.books():
+            outline = self.book_outline(book)
+            if outline is None:
+                print(f"警告: 仓库中没有书 '{book}'，已跳过")
+                continue
+            book_dir = os.path.join(output_dir, format_filename(book))
+            paths = outline.paths(format_filename)
+            folders = {}
+            for kind in kinds:
+                with self._lock:
+                    rows = self._conn.execute(
+                        "SELECT page, data FROM entries WHERE id IN "
+                        "(SELECT MAX(id) FROM entries WHERE book = ? AND kind = ? GROUP BY page) ORDER BY page",
+                        (book, kind)).fetchall()
+                for page, data in rows:
+                    index = outline.section_for_page(page + 1)
+                    folder = os.path.join(book_dir, *paths[index]) if index >= 0 else book_dir
+                    if folder not in folders:
+                        os.makedirs(long_path(folder), exist_ok=True)
+                        folders[folder] = True
+                    with open(long_path(os.path.join(folder, f"{page}{KINDS[kind]}")), 'wb') as f:
+                        f.write(data)
+                    written += 1
+        return written
+
+    def compact(self):
+        """删除被覆盖的旧记录并回收空间，返回删除的记录数"""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM entries WHERE id NOT IN (SELECT MAX(id) FROM entries GROUP BY book, kind, page)"
+            ).rowcount
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+        return removed
+
+    def stats(self):
+        """返回 {书名: {类型: 页数}}"""
+        result = {book: {} for book in self.books()}
+        with self._lock:
+            for book, kind, count in self._conn.execute(
+                    "SELECT book, kind, COUNT(DISTINCT page) FROM entries GROUP BY book, kind"):
+                result.setdefault(book, {})[kind] = count
+        return result
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='单文件页面仓库（渲染页面、OCR 结果和译文）')
+    parser.add_argument('store', help='仓库文件路径')
+    parser.add_argument('--export', help='导出为目录结构到指定目录')
+    parser.add_argument('--book', action='append', help='只导出指定的书，可重复指定')
+    parser.add_argument('--kind', action='append', choices=sorted(KINDS), help='只导出指定类型，可重复指定')
+    parser.add_argument('--compact', action='store_true', help='删除被覆盖的旧记录并回收空间')
+    # python page_store.py pages.db
+    # python page_store.py pages.db --export D:\output --kind ocr --kind translation
+    args = parser.parse_args()
+
+    if not os.path.exists(args.store):
+        print(f"错误: 文件 {args.store} 不存在")
+        return
+
+    with PageStore(args.store) as store:
+        if args.compact:
+            print(f"已删除 {store.compact()} 条旧记录")
+        if args.export:
+            start_time = time.time()
+            written = store.export(args.export, args.book, args.kind)
+            print(f"导出完成: {written} 个文件，耗时 {time.time() - start_time:.2f} 秒")
+        if not (args.compact or args.export):
+            for book, counts in store.stats().items():
+                print(f"{book}: " + ", ".join(f"{kind} {counts.get(kind, 0)}" for kind in KINDS))
+
+
+if __name__ == "__main__":
+    main()
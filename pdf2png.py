@@ -1,9 +1,12 @@
+import io
 import json
 import re
-import sys
-import fitz
+import argparse
 from pathlib import Path
+import fitz  # PyMuPDF库，用于PDF处理
 from pdf2image import convert_from_path
+from pdf_session import PdfSession, use_session, source_path
+from outline import Outline
 
 
 def format_filename(filename):
@@ -14,48 +17,51 @@ def format_filename(filename):
     return re.search(r'^\s*(.*?)\s*$', re.sub(illegal_filter, '', filename)).group(1)
 
 
+def walk_outline(outline):
+    """
+    迭代遍历 fitz 大纲链表，返回嵌套结构 [{"page", "title", "down": [...]}, ...]
+
+    使用显式栈代替递归，大纲很深或同级条目很多时也不会超过递归深度限制
+    """
+    result = []
+    stack = [(outline, result)]
+    while stack:
+        node, siblings = stack.pop()
+        while node:
+            info = {
+                "page": node.page,
+                "title": node.title
+            }
+            siblings.append(info)
+            if node.down:
+                info["down"] = []
+                stack.append((node.down, info["down"]))
+            node = node.next
+    return result
+
+
 def get_pdf_info(pdf_path):
     """
     获取 PDF 文件的信息，包括大纲、字体信息、插入的图像等
+
+    pdf_path 可以是文件路径，也可以是已打开的 PdfSession
     """
-    def r_get_outline(outline, child_type, parent_key=None, parent_list=None):
-        if parent_list is None:
-            parent_list = []
-        if parent_key is None:
-            parent_key = {}
-        info = {
-            "page": outline.page,
-            "title": outline.title
-        }
-        if child_type == "down":
-            parent_list = [info]
-            parent_key["down"] = parent_list
-            new_parent_key = info
-        elif child_type == "next":
-            parent_list.append(info)
-            new_parent_key = info
-        else:
-            parent_list.append(info)
-            new_parent_key = info
-        if outline.down:
-            r_get_outline(outline.down, "down", new_parent_key, parent_list)
-        if outline.next:
-            r_get_outline(outline.next, "next", new_parent_key, parent_list)
-        return parent_list
-
-    pdf_path = Path(pdf_path)
+    source = pdf_path
+    pdf_path = Path(source_path(source))
     try:
-        doc = fitz.open(pdf_path)
-        info = {
-            "FontInfos": doc.FontInfos,
-            "InsertedImages": doc.InsertedImages,
-            "Pages": doc.page_count,
-            "ShownPages": doc.ShownPages,
-            "metadata": doc.metadata
-        }
-        info["Outline"] = r_get_outline(doc.outline, "re", {}, [])
+        with use_session(source) as session:
+            doc = session.doc
+            info = {
+                "FontInfos": doc.FontInfos,
+                "InsertedImages": doc.InsertedImages,
+                "Pages": session.page_count,
+                "ShownPages": doc.ShownPages,
+                "metadata": dict(session.metadata)
+            }
+            # 没有大纲时整本书放在以文件名命名的一个目录中
+            outline = walk_outline(doc.outline) if session.get_toc() else []
+            info["Outline"] = outline or [{"page": 0, "title": pdf_path.stem}]
         info["metadata"]["title"] = format_filename(pdf_path.stem)
-        doc.close()
         return info
     except Exception as e:
         print(f"获取 PDF 信息时出错: {e}")
@@ -66,22 +72,11 @@ def get_pdf_info(pdf_path):
         }
 
 
-def flatten_outline(outline, parent_path=""):
-    """
-    扁平化大纲结构，添加路径信息
-    """
-    flattened = []
-    for item in outline:
-        item["path"] = parent_path / format_filename(item["title"])
-        flattened.append(item)
-        if "down" in item:
-            flattened.extend(flatten_outline(item["down"], item["path"]))
-    return flattened
-
-
 def save_pngs(pdf_info, images, output_dir):
     """
     将 PDF 页面保存为 PNG 图像
+
+    每个大纲条目对应一个目录，条目自身的页（到下一个条目之前）保存在该目录中。
     """
     output_dir = Path(output_dir)
     pdf_title = format_filename(pdf_info["metadata"]["title"])
@@ -95,46 +90,84 @@ def save_pngs(pdf_info, images, output_dir):
     main_dir = add_long_path_prefix(main_dir)
     main_dir.mkdir(parents=True, exist_ok=True)
 
-    flattered_outline = flatten_outline(pdf_info["Outline"], main_dir)
-
-    for i in range(len(flattered_outline) - 1):
-        folder_path = flattered_outline[i]["path"]
-        folder_path = add_long_path_prefix(folder_path)
+    outline = Outline.from_nested(pdf_info["Outline"], pdf_info["Pages"])
+    for index, path in enumerate(outline.paths(format_filename)):
+        folder_path = add_long_path_prefix(main_dir.joinpath(*path))
         folder_path.mkdir(parents=True, exist_ok=True)
-        for j in range(flattered_outline[i]["page"], flattered_outline[i + 1]["page"]):
+        first, last = outline.own_range(index)
+        for j in range(first - 1, last):
             image_path = folder_path / f"{j}.png"
             image_path = add_long_path_prefix(image_path)
             images[j].save(image_path)
 
-    last_folder = flattered_outline[-1]["path"]
-    last_folder = add_long_path_prefix(last_folder)
-    last_folder.mkdir(parents=True, exist_ok=True)
-    for j in range(flattered_outline[-1]["page"], pdf_info["Pages"]):
-        image_path = last_folder / f"{j}.png"
-        image_path = add_long_path_prefix(image_path)
-        images[j].save(image_path)
 
+def image_png_bytes(image):
+    """把 fitz.Pixmap 或 PIL 图像编码为 PNG 字节"""
+    if isinstance(image, fitz.Pixmap):
+        return image.tobytes("png")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def save_to_store(pdf_info, images, store):
+    """
+    将 PDF 页面保存到单文件页面仓库（page_store.PageStore）中，代替逐页写出 PNG 文件
 
-def main(pdf_path_set, output_dir):
+    同时保存大纲，之后可用 PageStore.export 导出为与 save_pngs 相同的目录结构。
+    """
+    book = format_filename(pdf_info["metadata"]["title"])
+    store.put_book(book, Outline.from_nested(pdf_info["Outline"], pdf_info["Pages"]), pdf_info["Pages"])
+    for j in range(pdf_info["Pages"]):
+        store.put(book, j, "png", image_png_bytes(images[j]))
+
+
+def main(pdf_path_set, output_dir, renderer="fitz", dpi=200, store=None):
     """
     主函数，处理多个 PDF 文件并保存为 PNG 图像
+
+    renderer 为 "fitz" 时复用同一个 PdfSession 读取信息并按需渲染页面，PDF 只解析一次；
+    为 "poppler" 时使用 pdf2image 一次性渲染全部页面。
+    指定 store（PageStore）时页面写入仓库，不再生成单独的 PNG 文件。
     """
     for pdf_path in pdf_path_set.split(","):
         pdf_path = Path(pdf_path.replace('"', '').replace("'", ""))
         try:
-            images = convert_from_path(pdf_path, use_pdftocairo=True, thread_count=10)
-            pdf_info = get_pdf_info(pdf_path)
-            json_path = pdf_path.with_suffix('.json')
-            with open(json_path, "w") as f:
-                f.write(json.dumps(pdf_info, indent=4))
-            save_pngs(pdf_info, images, output_dir)
+            with PdfSession(pdf_path) as session:
+                pdf_info = get_pdf_info(session)
+                json_path = pdf_path.with_suffix('.json')
+                with open(json_path, "w") as f:
+                    f.write(json.dumps(pdf_info, indent=4))
+                if renderer == "fitz":
+                    images = session.rendered_pages(dpi)
+                else:
+                    images = convert_from_path(pdf_path, dpi=dpi, use_pdftocairo=True, thread_count=10)
+                if store is not None:
+                    save_to_store(pdf_info, images, store)
+                else:
+                    save_pngs(pdf_info, images, output_dir)
         except Exception as e:
             print(f"处理 {pdf_path} 时出错: {e}")
     return True
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print("用法: python script.py <pdf_path_set> <output_dir>")
-        sys.exit(1)
-    main(sys.argv[1], sys.argv[2])
+    parser = argparse.ArgumentParser(description='按大纲把 PDF 页面渲染为 PNG')
+    parser.add_argument('pdf_path_set', help='PDF 文件路径，多个文件用逗号分隔')
+    parser.add_argument('output_dir', nargs='?', help='输出目录（使用 --store 时可省略）')
+    parser.add_argument('--store', help='写入单文件页面仓库（如 pages.db），代替逐页生成 PNG 文件')
+    parser.add_argument('--renderer', choices=['fitz', 'poppler'], default='fitz', help='渲染引擎，默认为 fitz')
+    parser.add_argument('--dpi', type=int, default=200, help='渲染 DPI，默认为 200')
+    # python pdf2png.py book.pdf D:\output
+    # python pdf2png.py book1.pdf,book2.pdf --store pages.db
+    args = parser.parse_args()
+    if not (args.output_dir or args.store):
+        parser.error("需要指定 output_dir 或 --store")
+
+    if args.store:
+        # page_store 依赖本模块的 format_filename，这里延迟导入以避免循环导入
+        from page_store import PageStore
+        with PageStore(args.store) as page_store:
+            main(args.pdf_path_set, args.output_dir, args.renderer, args.dpi, page_store)
+    else:
+        main(args.pdf_path_set, args.output_dir, args.renderer, args.dpi)
@@ -1,75 +1,62 @@
 import os
-import re
 import fitz  # PyMuPDF库，用于PDF处理
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tqdm import tqdm
+from pdf_session import use_session, source_path
+from outline import Outline
 
 def extract_bookmarks(pdf_path):
-    """提取PDF中的书签信息"""
+    """提取PDF中的书签信息，pdf_path 可以是文件路径或 PdfSession"""
     try:
-        with fitz.open(pdf_path) as doc:
-            toc = doc.get_toc()  # 获取目录
+        with use_session(pdf_path) as session:
+            toc = session.get_toc()  # 获取目录
             return toc
     except Exception as e:
         print(f"提取书签时出错: {e}")
         return []
 
 def save_bookmarks_to_file(bookmarks, output_file):
-    """将书签保存到文本文件"""
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for item in bookmarks:
-            level, title, page = item
-            indent = '  ' * (level - 1)  # 根据级别缩进
-            f.write(f"{indent}{title}@{page}\n")
+    """将书签保存到文本文件，bookmarks 可以是 [[level, title, page], ...] 或 Outline"""
+    outline = bookmarks if isinstance(bookmarks, Outline) else Outline.from_toc(bookmarks)
+    outline.save(output_file)
     print(f"书签已保存到 {output_file}")
 
 def load_bookmarks_from_file(file_path):
-    """从文本文件加载书签"""
-    bookmarks = []
+    """从文本文件加载书签，返回 [[level, title, page], ...]"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # 计算缩进级别
-                indent_match = re.match(r'^(\s*)', line)
-                indent = indent_match.group(1) if indent_match else ''
-                level = len(indent) // 2 + 1  # 假设两个空格为一个缩进级别
-                
-                # 提取标题和页码
-                content = line.lstrip()
-                if '@' in content:
-                    title, page = content.rsplit('@', 1)
-                    try:
-                        page_num = int(page.strip())
-                        bookmarks.append([level, title.strip(), page_num])
-                    except ValueError:
-                        print(f"警告: 无效的页码 '{page}'，跳过这一行: {line}")
-                else:
-                    print(f"警告: 格式不正确，跳过这一行: {line}")
-        return bookmarks
+        return Outline.load(file_path).to_toc()
     except Exception as e:
         print(f"加载书签时出错: {e}")
         return []
 
-def update_pdf_bookmarks(pdf_path, new_bookmarks, output_path=None):
-    """更新PDF的书签"""
+def update_pdf_bookmarks(pdf_path, new_bookmarks, output_path=None, incremental=False):
+    """
+    更新PDF的书签
+
+    incremental=True 时原地增量保存：只在文件末尾追加新的目录对象，不重写页面内容，
+    此时忽略 output_path；文件不支持增量保存时退回完整保存到 output_path。
+    pdf_path 可以是文件路径或 PdfSession，传入会话时修改后的目录会同步到会话缓存中。
+    """
+    source, pdf_path = pdf_path, source_path(pdf_path)
     if not output_path:
         base, ext = os.path.splitext(pdf_path)
         output_path = f"{base}_updated{ext}"
     
     try:
-        with fitz.open(pdf_path) as doc:
-            # 清除原有书签
-            doc.set_toc([])
-            
-            # 添加新书签
-            doc.set_toc(new_bookmarks)
+        with use_session(source) as session:
+            doc = session.doc
+            # 替换为新书签（set_toc 会先删除原有书签）
+            session.set_toc(new_bookmarks)
             
             # 保存修改后的PDF
-            doc.save(output_path)
+            if incremental and doc.can_save_incrementally():
+                doc.save(pdf_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+                output_path = pdf_path
+            else:
+                if incremental:
+                    print(f"警告: {pdf_path} 不支持增量保存，改为保存到 {output_path}")
+                doc.save(output_path)
         
         print(f"PDF书签已更新并保存到 {output_path}")
         return True
@@ -77,6 +64,57 @@ def update_pdf_bookmarks(pdf_path, new_bookmarks, output_path=None):
         print(f"更新书签时出错: {e}")
         return False
 
+def load_batch_manifest(manifest_path):
+    """
+    读取批处理清单
+
+    每行格式为 "PDF路径<Tab>书签文件[<Tab>输出路径]"，空行和以 # 开头的行会被忽略。
+    返回 (pdf_path, bookmarks_path, output_path) 列表，未指定输出路径时为 None。
+    """
+    jobs = []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [part.strip() for part in line.split('\t')]
+            if len(parts) < 2:
+                print(f"警告: 格式不正确，跳过这一行: {line}")
+                continue
+            jobs.append((parts[0], parts[1], parts[2] if len(parts) > 2 and parts[2] else None))
+    return jobs
+
+def process_batch_job(job, incremental=False):
+    """处理清单中的一项，供子进程调用"""
+    pdf_path, bookmarks_path, output_path = job
+    new_bookmarks = load_bookmarks_from_file(bookmarks_path)
+    if not new_bookmarks:
+        print(f"未能从 {bookmarks_path} 加载有效书签")
+        return False
+    return update_pdf_bookmarks(pdf_path, new_bookmarks, output_path, incremental)
+
+def batch_update_bookmarks(manifest_path, incremental=False, workers=None):
+    """按清单批量更新书签，多个文件在进程池中并行处理"""
+    try:
+        jobs = load_batch_manifest(manifest_path)
+    except Exception as e:
+        print(f"读取清单时出错: {e}")
+        return 0
+    if not jobs:
+        print("清单中没有有效的任务")
+        return 0
+
+    success = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_batch_job, job, incremental): job for job in jobs}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="批量更新书签"):
+            try:
+                success += bool(future.result())
+            except Exception as e:
+                print(f"处理 {futures[future][0]} 时出错: {e}")
+    print(f"批量更新完成！成功: {success}, 失败: {len(jobs) - success}")
+    return success
+
 def generate_sample_bookmarks():
     """生成示例书签用于演示"""
     return [
@@ -92,15 +130,27 @@ def generate_sample_bookmarks():
 
 def main():
     parser = argparse.ArgumentParser(description='PDF目录(书签)编辑工具')
-    parser.add_argument('pdf_path', help='PDF文件路径')
+    parser.add_argument('pdf_path', nargs='?', help='PDF文件路径')
     parser.add_argument('-o', '--output', help='输出PDF文件路径，默认为原文件名_updated.pdf')
     parser.add_argument('--extract', help='提取书签并保存到指定文件')
     parser.add_argument('--import', dest='import_file', help='从文件导入书签并更新PDF')
     parser.add_argument('--sample', action='store_true', help='使用示例书签更新PDF')
     parser.add_argument('--delete', action='store_true', help='删除所有书签')
+    parser.add_argument('--in-place', action='store_true', help='原地增量保存，不生成新文件')
+    parser.add_argument('--batch', help='批处理清单文件，每行为 "PDF路径<Tab>书签文件[<Tab>输出路径]"')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='批处理时的并行进程数，默认为CPU核数')
     
     args = parser.parse_args()
     
+    # 批处理
+    if args.batch:
+        batch_update_bookmarks(args.batch, args.in_place, args.jobs)
+        return
+    
+    if not args.pdf_path:
+        parser.print_help()
+        return
+    
     # 检查文件是否存在
     if not os.path.exists(args.pdf_path):
         print(f"错误: 文件 {args.pdf_path} 不存在")
@@ -124,7 +174,7 @@ def main():
     if args.import_file:
         new_bookmarks = load_bookmarks_from_file(args.import_file)
         if new_bookmarks:
-            update_pdf_bookmarks(args.pdf_path, new_bookmarks, args.output)
+            update_pdf_bookmarks(args.pdf_path, new_bookmarks, args.output, args.in_place)
         else:
             print("未能加载有效书签")
         return
@@ -132,12 +182,12 @@ def main():
     # 使用示例书签
     if args.sample:
         sample_bookmarks = generate_sample_bookmarks()
-        update_pdf_bookmarks(args.pdf_path, sample_bookmarks, args.output)
+        update_pdf_bookmarks(args.pdf_path, sample_bookmarks, args.output, args.in_place)
         return
     
     # 删除所有书签
     if args.delete:
-        update_pdf_bookmarks(args.pdf_path, [], args.output)
+        update_pdf_bookmarks(args.pdf_path, [], args.output, args.in_place)
         return
     
     # 如果没有提供任何操作参数，显示帮助信息
@@ -148,4 +198,6 @@ if __name__ == "__main__":
     main()
     # python pdf_bookmark_editor.py path/to/your/pdf.pdf --delete -o output.pdf
     # python pdf_bookmark_editor.py path/to/your/pdf.pdf --extract bookmarks.txt
-    # python pdf_bookmark_editor.py path/to/your/pdf.pdf --import new_bookmarks.txt
\ No newline at end of file
+    # python pdf_bookmark_editor.py path/to/your/pdf.pdf --import new_bookmarks.txt
+    # python pdf_bookmark_editor.py path/to/your/pdf.pdf --import new_bookmarks.txt --in-place
+    # python pdf_bookmark_editor.py --batch manifest.txt --in-place -j 4
\ No newline at end of file
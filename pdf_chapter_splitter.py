@@ -1,27 +1,301 @@
 import os
 import re
+import json
 import fitz  # PyMuPDF库，用于PDF处理
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PyPDF2 import PdfReader, PdfWriter
 from tqdm import tqdm
 import argparse
+from pdf_session import use_session, source_path
+from outline import Outline
 
 def extract_bookmarks(pdf_path):
-    """提取PDF中的书签信息"""
-    bookmarks = []
+    """提取PDF中的书签，返回 Outline（页码从1开始），pdf_path 可以是文件路径或 PdfSession"""
     try:
-        with fitz.open(pdf_path) as doc:
-            toc = doc.get_toc()  # 获取目录
-            for entry in toc:
-                level, title, page = entry
-                # 页码在PyMuPDF和PyPDF2中相差1
-                bookmarks.append((level, title, page - 1))
-        return bookmarks
+        with use_session(pdf_path) as session:
+            return Outline.from_toc(session.get_toc(), session.page_count)
     except Exception as e:
         print(f"提取书签时出错: {e}")
-        return []
+        return Outline()
 
-def split_pdf_by_bookmarks(pdf_path, output_dir=None, prefix="chapter_", clean_names=True):
-    """根据书签拆分PDF"""
+def build_split_points(outline, clean_names=True):
+    """根据大纲计算每个章节的标题和页码范围 [start_page, end_page)，页码从0开始"""
+    split_points = []
+    for i, (level, title, page) in enumerate(outline):
+        # 清理标题中的非法字符
+        if clean_names:
+            safe_title = re.sub(r'[\\/:*?"<>|]', '_', title)
+        else:
+            safe_title = title
+
+        # 如果标题为空，生成默认标题
+        if not safe_title.strip():
+            safe_title = f"chapter_{i+1}"
+
+        # 章节到下一个书签之前结束（从1开始的闭区间即从0开始的半开区间的终点）
+        start_page, end_page = outline.own_range(i)
+
+        # 章节信息；与下一个书签在同一页（如父书签和第一个子书签）时至少包含起始页，避免生成空文件
+        split_points.append({
+            'title': safe_title,
+            'start_page': start_page - 1,
+            'end_page': max(end_page, start_page),
+            'level': level
+        })
+    return split_points
+
+
+def chapter_filename(index, chapter, prefix, total):
+    """生成章节输出文件名"""
+    if total > 1:
+        return f"{prefix}{index+1:03d}_{chapter['title']}.pdf"
+    return f"{prefix}{chapter['title']}.pdf"
+
+
+def save_compact(doc, output_path, subset_fonts=False):
+    """
+    精简后保存：回收未引用对象、合并重复对象和流（garbage=4）并压缩流
+
+    subset_fonts=True 时先对嵌入字体做子集化（需要 fontTools，不可用时给出警告并跳过）。
+    """
+    if subset_fonts:
+        try:
+            doc.subset_fonts()
+        except Exception as e:
+            print(f"警告: 字体子集化失败，已跳过: {e}")
+    doc.save(output_path, garbage=4, deflate=True)
+
+
+def task_ranges(task):
+    """
+    返回写入任务包含的页码区间列表
+
+    任务为 (start_page, end_page, output_path)（一段连续页）或 (区间列表, output_path)（如 pdf_splitter 的 "1,3-5"），
+    页码从0开始，end_page 不含。
+    """
+    return [range(task[0], task[1])] if len(task) == 3 else task[0]
+
+
+def write_chapters(src, tasks, subset_fonts=False):
+    """
+    将若干章节写入独立文件
+
+    参数:
+    src (fitz.Document 或 str): 已打开的文档或PDF路径（子进程中按路径打开一次）
+    tasks (list): 写入任务列表，格式见 task_ranges，输出路径为每个任务的最后一项
+    subset_fonts (bool): 保存前是否对字体做子集化
+    """
+    doc = fitz.open(src) if isinstance(src, str) else src
+    try:
+        for task in tasks:
+            with fitz.open() as chapter_doc:
+                for r in task_ranges(task):
+                    chapter_doc.insert_pdf(doc, from_page=r.start, to_page=r.stop - 1)
+                save_compact(chapter_doc, task[-1], subset_fonts)
+        return len(tasks)
+    finally:
+        if doc is not src:
+            doc.close()
+
+
+def partition_tasks(tasks, workers):
+    """按页数把任务切分为 workers 组连续的块，使每组的页数大致相同"""
+    total_pages = sum(len(r) for task in tasks for r in task_ranges(task))
+    target = total_pages / workers
+    groups, current, current_pages = [], [], 0
+    for task in tasks:
+        current.append(task)
+        current_pages += sum(len(r) for r in task_ranges(task))
+        if current_pages >= target and len(groups) < workers - 1:
+            groups.append(current)
+            current, current_pages = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+def run_write_tasks(doc, pdf_path, tasks, workers, subset_fonts=False):
+    """执行写入任务：只有一组时直接复用已打开的文档，否则分组交给进程池"""
+    groups = partition_tasks(tasks, workers) if workers > 1 and len(tasks) > 1 else [tasks]
+    if len(groups) <= 1:
+        for task in tqdm(tasks, desc="正在拆分"):
+            write_chapters(doc, [task], subset_fonts)
+        return
+    with ProcessPoolExecutor(max_workers=len(groups)) as executor, \
+            tqdm(total=len(tasks), desc="正在拆分") as progress_bar:
+        futures = [executor.submit(write_chapters, pdf_path, group, subset_fonts) for group in groups]
+        for future in as_completed(futures):
+            progress_bar.update(future.result())
+
+
+def split_pdf_by_bookmarks_fast(pdf_path, output_dir=None, prefix="chapter_", clean_names=True, workers=None,
+                                subset_fonts=False):
+    """
+    根据书签拆分PDF（PyMuPDF 快速路径）
+
+    只用 fitz 解析一次文档即可得到目录和页数，章节通过 insert_pdf 整段复制页面。
+    章节较多时按页数把写入任务分给进程池，每个子进程只打开一次源文件。
+    pdf_path 可以是文件路径或 PdfSession。
+    """
+    source, pdf_path = pdf_path, source_path(pdf_path)
+    if not output_dir:
+        output_dir = os.path.splitext(pdf_path)[0] + "_chapters"
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    try:
+        with use_session(source) as session:
+            doc = session.doc
+            num_pages = session.page_count
+            outline = Outline.from_toc(session.get_toc(), num_pages)
+            if not outline:
+                print("未找到书签信息，无法按章节拆分。")
+                return False
+
+            print(f"找到 {len(outline)} 个书签")
+            split_points = build_split_points(outline, clean_names)
+
+            tasks = []
+            for i, chapter in enumerate(split_points):
+                start_page = chapter['start_page']
+                if not 0 <= start_page < num_pages:
+                    print(f"警告: 书签 '{chapter['title']}' 的页码无效，已跳过")
+                    continue
+                end_page = min(chapter['end_page'], num_pages)
+                output_path = os.path.join(output_dir, chapter_filename(i, chapter, prefix, len(split_points)))
+                tasks.append((start_page, end_page, output_path))
+
+            print(f"开始拆分为 {len(tasks)} 个章节...")
+            run_write_tasks(doc, pdf_path, tasks, workers, subset_fonts)
+
+        print(f"拆分完成! 共生成 {len(tasks)} 个文件，保存在: {output_dir}")
+        return True
+
+    except Exception as e:
+        print(f"拆分PDF时出错: {e}")
+        return False
+
+
+def build_outline_tree(toc, num_pages, max_level=None, clean_names=True):
+    """
+    将目录转换为章节树
+
+    每个节点的 own_pages 是从本节点起始页到下一个（未被 max_level 过滤的）书签起始页之间的页，
+    即只属于该节点、不属于任何子节点的页，因此每一页恰好属于一个节点；
+    span 是节点连同全部子节点覆盖的页范围。第一个书签之前的页归入"front_matter"节点。
+    页范围均为从0开始的半开区间。
+    """
+    entries = []
+    for level, title, page in toc:
+        if max_level and level > max_level:
+            continue
+        if not 1 <= page <= num_pages:
+            print(f"警告: 书签 '{title}' 的页码无效，已跳过")
+            continue
+        safe_title = re.sub(r'[\\/:*?"<>|]', '_', title) if clean_names else title
+        entries.append((level, safe_title.strip() or f"chapter_{len(entries)+1}", page))
+
+    if entries and entries[0][2] > 1:
+        entries.insert(0, (entries[0][0], "front_matter", 1))
+
+    outline = Outline(entries, num_pages)
+    roots, nodes = [], []
+    for i, (level, title, page) in enumerate(outline):
+        own_end = outline.own_range(i)[1]
+        span_end = outline.span_range(i)[1]
+        node = {'title': title, 'level': level, 'start_page': page - 1, 'children': [],
+                'own_pages': (page - 1, own_end), 'span': (page - 1, span_end)}
+        parent = outline.parents[i]
+        (nodes[parent]['children'] if parent >= 0 else roots).append(node)
+        nodes.append(node)
+    return roots
+
+
+def split_pdf_hierarchical(pdf_path, output_dir=None, layout="tree", max_level=None, clean_names=True,
+                           workers=None, subset_fonts=False):
+    """
+    按书签层级拆分PDF，每一页只写入一次
+
+    参数:
+    layout (str): "tree" 时有子节点的书签生成目录，其自身页写入目录中的 000_ 文件，子节点依次放在目录内；
+                  "manifest" 时所有文件平铺在 output_dir 中，并生成描述层级关系的 manifest.json
+    max_level (int): 只按不超过该级别的书签拆分，更深的书签页并入其上级
+    subset_fonts (bool): 保存前对字体做子集化（需要 fontTools），默认不做
+    pdf_path 可以是文件路径或 PdfSession。
+    """
+    source, pdf_path = pdf_path, source_path(pdf_path)
+    if not output_dir:
+        output_dir = os.path.splitext(pdf_path)[0] + "_chapters"
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    try:
+        with use_session(source) as session:
+            doc = session.doc
+            num_pages = session.page_count
+            roots = build_outline_tree(session.get_toc(), num_pages, max_level, clean_names)
+            if not roots:
+                print("未找到书签信息，无法按章节拆分。")
+                return False
+
+            tasks = []
+            if layout == "tree":
+                stack = [(roots, output_dir)]
+                while stack:
+                    nodes, parent_dir = stack.pop()
+                    for index, node in enumerate(nodes, 1):
+                        name = f"{index:03d}_{node['title']}"
+                        start, end = node['own_pages']
+                        if node['children']:
+                            node_dir = os.path.join(parent_dir, name)
+                            os.makedirs(node_dir, exist_ok=True)
+                            if end > start:
+                                tasks.append((start, end, os.path.join(node_dir, f"000_{node['title']}.pdf")))
+                            stack.append((node['children'], node_dir))
+                        elif end > start:
+                            tasks.append((start, end, os.path.join(parent_dir, f"{name}.pdf")))
+                tasks.sort()
+            else:
+                def to_manifest(node):
+                    start, end = node['own_pages']
+                    item = {
+                        'title': node['title'],
+                        'level': node['level'],
+                        'start_page': node['span'][0] + 1,
+                        'end_page': node['span'][1],
+                        'file': None,
+                    }
+                    if end > start:
+                        filename = f"{len(tasks)+1:04d}_{node['title']}.pdf"
+                        tasks.append((start, end, os.path.join(output_dir, filename)))
+                        item['file'] = filename
+                        item['pages'] = [start + 1, end]
+                    item['children'] = [to_manifest(child) for child in node['children']]
+                    return item
+
+                manifest = {'source': os.path.basename(pdf_path), 'pages': num_pages,
+                            'outline': [to_manifest(root) for root in roots]}
+                with open(os.path.join(output_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+            print(f"开始拆分为 {len(tasks)} 个文件（共 {sum(end - start for start, end, _ in tasks)} 页）...")
+            run_write_tasks(doc, pdf_path, tasks, workers, subset_fonts)
+
+        print(f"拆分完成! 共生成 {len(tasks)} 个文件，保存在: {output_dir}")
+        return True
+
+    except Exception as e:
+        print(f"拆分PDF时出错: {e}")
+        return False
+
+
+def split_pdf_by_bookmarks(pdf_path, output_dir=None, prefix="chapter_", clean_names=True, engine="fitz", workers=None,
+                           subset_fonts=False):
+    """根据书签拆分PDF，engine 为 fitz（默认，快速路径）或 pypdf2"""
+    if engine == "fitz":
+        return split_pdf_by_bookmarks_fast(pdf_path, output_dir, prefix, clean_names, workers, subset_fonts)
+
+    source, pdf_path = pdf_path, source_path(pdf_path)
     if not output_dir:
         output_dir = os.path.splitext(pdf_path)[0] + "_chapters"
 
@@ -29,71 +303,43 @@ def split_pdf_by_bookmarks(pdf_path, output_dir=None, prefix="chapter_", clean_n
     os.makedirs(output_dir, exist_ok=True)
 
     try:
-        # 读取PDF
+        # 读取PDF（PdfReader 只接受文件路径）
         reader = PdfReader(pdf_path)
         num_pages = len(reader.pages)
 
         # 提取书签
-        bookmarks = extract_bookmarks(pdf_path)
+        bookmarks = extract_bookmarks(source)
         if not bookmarks:
             print("未找到书签信息，无法按章节拆分。")
             return False
 
-        print(f"找到 {len(bookmarks)} 个书签: {bookmarks}")
+        print(f"找到 {len(bookmarks)} 个书签")
 
         # 准备拆分点
-        split_points = []
-        prev_page = 0
-
-        # 处理每个书签
-        for i, (level, title, page) in enumerate(bookmarks):
-            # 清理标题中的非法字符
-            if clean_names:
-                safe_title = re.sub(r'[\\/:*?"<>|]', '_', title)
-            else:
-                safe_title = title
-
-            # 如果标题为空，生成默认标题
-            if not safe_title.strip():
-                safe_title = f"chapter_{i+1}"
-
-            # 确定章节的结束页
-            if i < len(bookmarks) - 1:
-                end_page = bookmarks[i+1][2]
-            else:
-                end_page = num_pages
-
-            # 章节信息
-            chapter_info = {
-                'title': safe_title,
-                'start_page': page,
-                'end_page': end_page,
-                'level': level
-            }
-            split_points.append(chapter_info)
+        split_points = build_split_points(bookmarks, clean_names)
 
         # 拆分PDF
         print(f"开始拆分为 {len(split_points)} 个章节...")
+        written = 0
         for i, chapter in enumerate(tqdm(split_points, desc="正在拆分")):
+            if not 0 <= chapter['start_page'] < num_pages:
+                print(f"警告: 书签 '{chapter['title']}' 的页码无效，已跳过")
+                continue
             writer = PdfWriter()
 
             # 添加页面
-            for page_num in range(chapter['start_page'], chapter['end_page']):
+            for page_num in range(chapter['start_page'], min(chapter['end_page'], num_pages)):
                 writer.add_page(reader.pages[page_num])
 
             # 生成输出文件名
-            if len(split_points) > 1:
-                output_filename = f"{prefix}{i+1:03d}_{chapter['title']}.pdf"
-            else:
-                output_filename = f"{prefix}{chapter['title']}.pdf"
-
-            output_path = os.path.join(output_dir, output_filename)
+            output_path = os.path.join(output_dir, chapter_filename(i, chapter, prefix, len(split_points)))
 
             # 写入文件
             with open(output_path, 'wb') as output_pdf:
                 writer.write(output_pdf)
+            written += 1
 
-        print(f"拆分完成! 共生成 {len(split_points)} 个文件，保存在: {output_dir}")
+        print(f"拆分完成! 共生成 {written} 个文件，保存在: {output_dir}")
         return True
 
     except Exception as e:
@@ -106,7 +352,14 @@ def main():
     parser.add_argument('-o', '--output', help='输出目录，默认为"原文件名_chapters"')
     parser.add_argument('-p', '--prefix', default='chapter_', help='输出文件前缀，默认为"chapter_"')
     parser.add_argument('--keep-names', action='store_true', help='保留原书签名称中的特殊字符')
-    # python pdf_chapter_splitter.py example.pdf -o output_dir -p my_chapter_ --keep-names
+    parser.add_argument('--engine', choices=['fitz', 'pypdf2'], default='fitz', help='拆分引擎，默认为 fitz（单次解析+多进程写入）')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='并行写入的进程数，默认为CPU核数')
+    parser.add_argument('--layout', choices=['flat', 'tree', 'manifest'], default='flat',
+                        help='flat: 每个书签一个文件（默认）; tree: 按层级生成嵌套目录; manifest: 平铺文件并生成 manifest.json')
+    parser.add_argument('--max-level', type=int, default=None, help='tree/manifest 模式下只按不超过该级别的书签拆分')
+    parser.add_argument('--subset-fonts', action='store_true', help='对输出文件做字体子集化（需要 fontTools）')
+    # python pdf_chapter_splitter.py example.pdf -o output_dir -p my_chapter_ --keep-names -j 8
+    # python pdf_chapter_splitter.py example.pdf -o output_dir --layout tree --max-level 2
     args = parser.parse_args()
 
     # 检查文件是否存在
@@ -120,11 +373,26 @@ def main():
         return
 
     # 执行拆分
+    if args.layout != 'flat':
+        split_pdf_hierarchical(
+            args.pdf_path,
+            output_dir=args.output,
+            layout=args.layout,
+            max_level=args.max_level,
+            clean_names=not args.keep_names,
+            workers=args.jobs,
+            subset_fonts=args.subset_fonts
+        )
+        return
+
     split_pdf_by_bookmarks(
         args.pdf_path,
         output_dir=args.output,
         prefix=args.prefix,
-        clean_names=not args.keep_names
+        clean_names=not args.keep_names,
+        engine=args.engine,
+        workers=args.jobs,
+        subset_fonts=args.subset_fonts
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+from pdf_session import PdfSession
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pdfs (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    pages INTEGER,
+    title TEXT,
+    author TEXT,
+    metadata TEXT,
+    outline_count INTEGER,
+    outline_depth INTEGER,
+    fonts TEXT,
+    font_count INTEGER,
+    image_count INTEGER,
+    error TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outline (
+    path TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    PRIMARY KEY (path, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_pdfs_outline_count ON pdfs(outline_count);
+"""
+
+# 常用查询，可通过 --query 名称直接调用
+QUERIES = {
+    "no-outline": "SELECT path, pages FROM pdfs WHERE error IS NULL AND outline_count = 0 ORDER BY path",
+    "total-pages": "SELECT COUNT(*) AS files, SUM(pages) AS pages FROM pdfs WHERE error IS NULL",
+    "errors": "SELECT path, error FROM pdfs WHERE error IS NOT NULL ORDER BY path",
+    "largest": "SELECT path, pages, size FROM pdfs WHERE error IS NULL ORDER BY pages DESC LIMIT 20",
+}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """分块计算文件的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_pdf_record(path, known_sha256=None):
+    """
+    提取单个 PDF 的索引信息，供子进程调用
+
+    先计算文件哈希，与 known_sha256 相同（仅修改时间变化）时不再打开文档，只返回基本信息。
+    目录通过 get_toc 一次性得到扁平列表，不做递归遍历。
+    """
+    stat = os.stat(path)
+    record = {"path": path, "size": stat.st_size, "mtime": stat.st_mtime,
+              "sha256": file_sha256(path), "unchanged": False}
+    if known_sha256 is not None and record["sha256"] == known_sha256:
+        record["unchanged"] = True
+        return record
+
+    try:
+        with PdfSession(path) as session:
+            toc = session.get_toc()
+            fonts, image_xrefs = set(), set()
+            for page in session.doc:
+                fonts.update(font[3] for font in page.get_fonts())
+                image_xrefs.update(image[0] for image in page.get_images())
+            metadata = session.metadata
+            record.update({
+                "pages": session.page_count,
+                "title": metadata.get("title") or os.path.splitext(os.path.basename(path))[0],
+                "author": metadata.get("author") or None,
+                "metadata": json.dumps(metadata, ensure_ascii=False),
+                "toc": toc,
+                "outline_depth": max((entry[0] for entry in toc), default=0),
+                "fonts": sorted(fonts),
+                "image_count": len(image_xrefs),
+                "error": None,
+            })
+    except Exception as e:
+        record.update({"pages": None, "title": None, "author": None, "metadata": None, "toc": [],
+                       "outline_depth": 0, "fonts": [], "image_count": None, "error": str(e)})
+    return record
+
+
+def scan_pdfs(root):
+    """用 os.scandir 迭代遍历目录，返回 {路径: (大小, 修改时间)}"""
+    found = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith('.pdf'):
+                        try:
+                            stat = entry.stat()
+                        except OSError as e:
+                            print(f"无法读取 {entry.path}: {e}")
+                            continue
+                        found[os.path.abspath(entry.path)] = (stat.st_size, stat.st_mtime)
+        except PermissionError:
+            print(f"没有权限访问 {directory}")
+    return found
+
+
+class PdfIndex:
+    """PDF 库的 SQLite 元数据索引"""
+
+    def __init__(self, db_path="pdf_index.db"):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def update(self, root, workers=None):
+        """
+        增量刷新索引
+
+        大小和修改时间都未变的文件直接跳过；有变化的文件在进程池中重新计算哈希，
+        哈希未变时只更新修改时间，否则重新提取信息。已删除的文件从索引中移除。
+        单个文件无法读取（如权限不足、扫描期间被删除）时给出提示并继续处理其余文件，下次扫描时重试。
+        返回 (新增或更新数, 跳过数, 删除数, 失败数)。
+        """
+        root = os.path.abspath(root)
+        found = scan_pdfs(root)
+        prefix = os.path.join(root, '')
+        known = {path: (size, mtime, sha256) for path, size, mtime, sha256 in self.conn.execute(
+            "SELECT path, size, mtime, sha256 FROM pdfs WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+
+        removed = [path for path in known if path not in found]
+        with self.conn:
+            self.conn.executemany("DELETE FROM pdfs WHERE path = ?", [(path,) for path in removed])
+            self.conn.executemany("DELETE FROM outline WHERE path = ?", [(path,) for path in removed])
+
+        changed = [path for path, (size, mtime) in found.items()
+                   if path not in known or known[path][:2] != (size, mtime)]
+        skipped = len(found) - len(changed)
+        updated = failed = 0
+        if changed:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(extract_pdf_record, path, known.get(path, (None, None, None))[2]): path
+                           for path in changed}
+                for future in tqdm(as_completed(futures), total=len(futures), desc="索引进度"):
+                    try:
+                        record = future.result()
+                    except Exception as e:
+                        print(f"无法索引 {futures[future]}: {e}")
+                        failed += 1
+                        continue
+                    if record["unchanged"]:
+                        with self.conn:
+                            self.conn.execute("UPDATE pdfs SET mtime = ?, size = ? WHERE path = ?",
+                                              (record["mtime"], record["size"], record["path"]))
+                        skipped += 1
+                    else:
+                        self._store(record)
+                        updated += 1
+        return updated, skipped, len(removed), failed
+
+    def _store(self, record):
+        path = record["path"]
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO pdfs (path, size, mtime, sha256, pages, title, author, metadata,
+                    outline_count, outline_depth, fonts, font_count, image_count, error, indexed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (path, record["size"], record["mtime"], record["sha256"], record["pages"], record["title"],
+                 record["author"], record["metadata"], len(record["toc"]), record["outline_depth"],
+                 json.dumps(record["fonts"], ensure_ascii=False), len(record["fonts"]),
+                 record["image_count"], record["error"], time.time())
+            )
+            self.conn.execute("DELETE FROM outline WHERE path = ?", (path,))
+            self.conn.executemany(
+                "INSERT INTO outline (path, seq, level, title, page) VALUES (?, ?, ?, ?, ?)",
+                [(path, seq, level, title, page) for seq, (level, title, page) in enumerate(record["toc"])]
+            )
+
+    def query(self, sql, params=()):
+        """执行查询，返回 (列名列表, 结果行列表)"""
+        cursor = self.conn.execute(sql, params)
+        columns = [column[0] for column in cursor.description or []]
+        return columns, cursor.fetchall()
+
+    def files_without_outline(self):
+        return [path for path, _ in self.query(QUERIES["no-outline"])[1]]
+
+    def total_pages(self):
+        return self.query(QUERIES["total-pages"])[1][0][1] or 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF 库元数据索引工具')
+    parser.add_argument('--db', default='pdf_index.db', help='索引数据库路径，默认为 pdf_index.db')
+    parser.add_argument('--scan', help='扫描并增量更新指定目录的索引')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='并行进程数，默认为CPU核数')
+    parser.add_argument('--query', choices=sorted(QUERIES), help='执行预定义查询')
+    parser.add_argument('--sql', help='执行自定义 SQL 查询')
+    # python pdf_index.py --scan D:\books -j 8
+    # python pdf_index.py --query no-outline
+    # python pdf_index.py --sql "SELECT path FROM outline WHERE title LIKE '%QCD%'"
+    args = parser.parse_args()
+
+    if not (args.scan or args.query or args.sql):
+        parser.print_help()
+        return
+
+    with PdfIndex(args.db) as index:
+        if args.scan:
+            if not os.path.isdir(args.scan):
+                print(f"错误: 目录 '{args.scan}' 不存在")
+                return
+            start_time = time.time()
+            updated, skipped, removed, failed = index.update(args.scan, args.jobs)
+            print(f"索引完成: 更新 {updated}, 未变 {skipped}, 删除 {removed}, 失败 {failed}, "
+                  f"耗时 {time.time() - start_time:.2f} 秒")
+
+        for sql in filter(None, [QUERIES.get(args.query), args.sql]):
+            try:
+                columns, rows = index.query(sql)
+            except sqlite3.Error as e:
+                print(f"查询出错: {e}")
+                continue
+            print("\t".join(columns))
+            for row in rows:
+                print("\t".join("" if value is None else str(value) for value in row))
+
+
+if __name__ == "__main__":
+    main()
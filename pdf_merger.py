@@ -1,8 +1,126 @@
 import os
 import argparse
+import fitz  # PyMuPDF库，用于快速合并
 from PyPDF2 import PdfReader, PdfWriter, PageObject
 
-def merge_pdfs(input_pdfs, output_pdf, add_top_level_bookmarks=True):
+def merge_pdfs_fitz(input_pdfs, output_pdf, add_top_level_bookmarks=True):
+    """
+    使用 PyMuPDF 合并多个 PDF 文件
+
+    每个输入文件通过 insert_pdf 整体复制页树，书签从 get_toc 读取后批量调整页码和层级，
+    最后一次性 set_toc，不需要逐条查找书签对应的页。
+    """
+    merged = fitz.open()
+    toc = []
+    merged_count = 0
+
+    for pdf_path in input_pdfs:
+        if not os.path.exists(pdf_path):
+            print(f"警告: 文件 '{pdf_path}' 不存在，已跳过。")
+            continue
+
+        try:
+            with fitz.open(pdf_path) as src:
+                page_offset = merged.page_count
+                merged.insert_pdf(src)
+
+                # 获取文件名作为书签标题
+                pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+                level_offset = 0
+                if add_top_level_bookmarks:
+                    toc.append([1, pdf_name, page_offset + 1])
+                    level_offset = 1
+
+                # 复制原始书签并调整页码（toc 页码从1开始，无效目标为 -1）
+                for level, title, page in src.get_toc():
+                    toc.append([level + level_offset, title, page + page_offset if page > 0 else -1])
+                merged_count += 1
+        except Exception as e:
+            print(f"警告: 处理文件 '{pdf_path}' 时出错: {str(e)}，已跳过。")
+
+    if merged.page_count == 0:
+        print("错误: 没有有效的页面可合并。")
+        return
+
+    try:
+        merged.set_toc(toc)
+        merged.save(output_pdf, garbage=3, deflate=True)
+        print(f"成功合并 {merged_count} 个 PDF 文件到 '{output_pdf}'")
+    except Exception as e:
+        print(f"错误: 写入文件 '{output_pdf}' 时出错: {str(e)}")
+    finally:
+        merged.close()
+
+def append_pdfs(target_pdf, input_pdfs, add_top_level_bookmarks=True):
+    """
+    将新的 PDF 追加到已合并的文件末尾（增量保存）
+
+    新页面写入文件末尾的增量更新段，原有页面不重写。书签不是增量的：set_toc 会删除原有大纲，
+    按完整的书签列表重新生成，所以每次追加都会把整个大纲（所有书签对象）重写一遍，
+    这部分耗时和 I/O 与书签总数成正比；页面部分只与追加的内容成正比。
+    文件不支持增量保存时退回完整保存。
+
+    参数:
+    target_pdf (str): 已存在的合并文件，原地修改
+    input_pdfs (list): 要追加的 PDF 文件路径列表
+    add_top_level_bookmarks (bool): 是否为每个追加的 PDF 添加顶级书签
+    """
+    if not os.path.exists(target_pdf):
+        print(f"错误: 目标文件 '{target_pdf}' 不存在，请先使用普通合并模式创建。")
+        return
+
+    try:
+        doc = fitz.open(target_pdf)
+    except Exception as e:
+        print(f"错误: 打开文件 '{target_pdf}' 时出错: {str(e)}")
+        return
+
+    try:
+        toc = doc.get_toc(simple=False)
+        appended = 0
+        for pdf_path in input_pdfs:
+            if not os.path.exists(pdf_path):
+                print(f"警告: 文件 '{pdf_path}' 不存在，已跳过。")
+                continue
+
+            try:
+                with fitz.open(pdf_path) as src:
+                    page_offset = doc.page_count
+                    doc.insert_pdf(src)
+
+                    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+                    level_offset = 0
+                    if add_top_level_bookmarks:
+                        toc.append([1, pdf_name, page_offset + 1])
+                        level_offset = 1
+                    for level, title, page in src.get_toc():
+                        toc.append([level + level_offset, title, page + page_offset if page > 0 else -1])
+                    appended += 1
+            except Exception as e:
+                print(f"警告: 处理文件 '{pdf_path}' 时出错: {str(e)}，已跳过。")
+
+        if not appended:
+            print("错误: 没有有效的页面可追加。")
+            return
+
+        # 整个大纲按 toc 重建，不只是新增的书签
+        doc.set_toc(toc)
+        if doc.can_save_incrementally():
+            doc.save(target_pdf, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        else:
+            print(f"警告: '{target_pdf}' 不支持增量保存，改为完整保存。")
+            temp_path = target_pdf + ".tmp"
+            doc.save(temp_path, garbage=3, deflate=True)
+            doc.close()
+            os.replace(temp_path, target_pdf)
+        print(f"成功追加 {appended} 个 PDF 文件到 '{target_pdf}'")
+    except Exception as e:
+        print(f"错误: 追加到文件 '{target_pdf}' 时出错: {str(e)}")
+    finally:
+        if not doc.is_closed:
+            doc.close()
+
+def merge_pdfs(input_pdfs, output_pdf, add_top_level_bookmarks=True, engine="fitz"):
     """
     合并多个 PDF 文件并选择性地添加顶级书签
     
@@ -10,7 +128,11 @@ def merge_pdfs(input_pdfs, output_pdf, add_top_level_bookmarks=True):
     input_pdfs (list): 输入 PDF 文件路径列表
     output_pdf (str): 输出 PDF 文件路径
     add_top_level_bookmarks (bool): 是否为每个输入 PDF 添加顶级书签
+    engine (str): "fitz"（默认，批量复制）或 "pypdf2"
     """
+    if engine == "fitz":
+        return merge_pdfs_fitz(input_pdfs, output_pdf, add_top_level_bookmarks)
+
     pdf_writer = PdfWriter()
     page_offset = 0
     
@@ -40,7 +162,8 @@ def merge_pdfs(input_pdfs, output_pdf, add_top_level_bookmarks=True):
             
             # 复制原始书签并调整页码
             if pdf_reader.outline:
-                copy_bookmarks(pdf_reader, pdf_writer, pdf_reader.outline, parent=top_level_bookmark, page_offset=page_offset)
+                copy_bookmarks(pdf_reader, pdf_writer, pdf_reader.outline, parent=top_level_bookmark,
+                               page_offset=page_offset, page_index=build_page_index(pdf_reader))
             
             # 更新页面偏移量
             page_offset += num_pages
@@ -60,7 +183,30 @@ def merge_pdfs(input_pdfs, output_pdf, add_top_level_bookmarks=True):
     except Exception as e:
         print(f"错误: 写入文件 '{output_pdf}' 时出错: {str(e)}")
 
-def copy_bookmarks(reader, writer, outlines, parent=None, page_offset=0):
+def build_page_index(reader):
+    """
+    建立页面对象编号到页码的映射
+
+    reader.get_page_number 每次都线性扫描页列表，书签很多时整体为 O(书签数 × 页数)；
+    预先建立映射后每次查找为 O(1)。
+    """
+    page_index = {}
+    for page_number, page in enumerate(reader.pages):
+        ref = getattr(page, 'indirect_reference', None)
+        if ref is not None:
+            page_index[ref.idnum] = page_number
+    return page_index
+
+def lookup_page_number(reader, page, page_index=None):
+    """通过映射查找书签目标页的页码，映射中没有时退回 reader.get_page_number"""
+    if page_index:
+        ref = getattr(page, 'indirect_reference', None) or page
+        idnum = getattr(ref, 'idnum', None)
+        if idnum in page_index:
+            return page_index[idnum]
+    return reader.get_page_number(page)
+
+def copy_bookmarks(reader, writer, outlines, parent=None, page_offset=0, page_index=None):
     """
     递归复制书签并调整页码
     
@@ -70,23 +216,29 @@ def copy_bookmarks(reader, writer, outlines, parent=None, page_offset=0):
     outlines (list): 当前级别的书签列表
     parent: 父级书签
     page_offset (int): 页码偏移量
+    page_index (dict): build_page_index 返回的页面映射
     """
+    last_bookmark = parent
     for outline in outlines:
         if isinstance(outline, list):
-            # 递归处理子书签
-            copy_bookmarks(reader, writer, outline, parent=parent, page_offset=page_offset)
+            # 嵌套列表是前一个书签的子书签
+            copy_bookmarks(reader, writer, outline, parent=last_bookmark, page_offset=page_offset,
+                           page_index=page_index)
         else:
             try:
                 # 获取原始书签的页码
                 if hasattr(outline, 'page') and outline.page is not None:
-                    page_number = reader.get_page_number(outline.page)
+                    page_number = lookup_page_number(reader, outline.page, page_index)
                     # 创建新书签
                     title = outline.title if hasattr(outline, 'title') else "未命名书签"
                     new_bookmark = writer.add_outline_item(title, page_number + page_offset, parent=parent)
+                    last_bookmark = new_bookmark
                     
-                    # 如果有子书签，递归处理
-                    if hasattr(outline, 'children') and outline.children:
-                        copy_bookmarks(reader, writer, outline.children, parent=new_bookmark, page_offset=page_offset)
+                    # 如果有子书签，递归处理（新版 PyPDF2 中 children 是方法，子书签以嵌套列表给出）
+                    children = getattr(outline, 'children', None)
+                    if isinstance(children, list) and children:
+                        copy_bookmarks(reader, writer, children, parent=new_bookmark,
+                                       page_offset=page_offset, page_index=page_index)
             except Exception as e:
                 print(f"警告: 复制书签时出错: {str(e)}，已跳过。")
 
@@ -94,11 +246,20 @@ def main():
     parser = argparse.ArgumentParser(description='合并多个 PDF 文件并更新书签')
     parser.add_argument('-o', '--output', required=True, help='输出 PDF 文件路径')
     parser.add_argument('-t', '--no-top-level', action='store_true', help='不添加顶级书签')
+    parser.add_argument('--engine', choices=['fitz', 'pypdf2'], help='合并引擎，默认为 fitz（--append 总是使用 fitz）')
+    parser.add_argument('-a', '--append', action='store_true', help='将输入文件增量追加到已存在的输出文件末尾')
     parser.add_argument('pdfs', nargs='+', help='输入 PDF 文件路径列表')
 
     
     args = parser.parse_args()
     # python pdf_merger.py -o merged.pdf file1.pdf file2.pdf file3.pdf
+    # python pdf_merger.py -o merged.pdf --append file4.pdf
+    if args.append:
+        if args.engine:
+            parser.error("--append 只支持 fitz 引擎，不能与 --engine 同时使用")
+        append_pdfs(args.output, args.pdfs, not args.no_top_level)
+        return
+
     # 检查输出文件目录是否存在
     output_dir = os.path.dirname(args.output)
     if output_dir and not os.path.exists(output_dir):
@@ -108,7 +269,7 @@ def main():
             print(f"错误: 创建输出目录时出错: {str(e)}")
             return
     
-    merge_pdfs(args.pdfs, args.output, not args.no_top_level)
+    merge_pdfs(args.pdfs, args.output, not args.no_top_level, args.engine or "fitz")
 
 if __name__ == "__main__":
     main()    
\ No newline at end of file
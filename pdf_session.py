@@ -0,0 +1,123 @@
+import os
+from contextlib import contextmanager
+import fitz  # PyMuPDF库，用于PDF处理
+
+
+class PdfSession:
+    """
+    PDF 文档会话：只打开并解析一次 PDF，缓存页数、xref 数量、目录和元数据
+
+    渲染、拆分、书签和文本提取等函数都可以直接接收 PdfSession 代替文件路径，
+    多步骤处理同一个大文件时不必每一步都重新解析。需要多进程处理的函数仍通过 path 在子进程中重新打开。
+    """
+
+    def __init__(self, source):
+        if isinstance(source, fitz.Document):
+            self.doc = source
+            self.path = source.name
+        else:
+            self.path = os.fspath(source)
+            self.doc = fitz.open(self.path)
+        self._page_count = None
+        self._xref_count = None
+        self._toc = None
+        self._metadata = None
+
+    @property
+    def page_count(self):
+        if self._page_count is None:
+            self._page_count = self.doc.page_count
+        return self._page_count
+
+    @property
+    def xref_count(self):
+        if self._xref_count is None:
+            self._xref_count = self.doc.xref_length()
+        return self._xref_count
+
+    @property
+    def metadata(self):
+        if self._metadata is None:
+            self._metadata = dict(self.doc.metadata or {})
+        return self._metadata
+
+    def get_toc(self):
+        """返回目录 [[level, title, page], ...]（页码从1开始），结果会被缓存，返回副本供调用方修改"""
+        if self._toc is None:
+            self._toc = self.doc.get_toc()
+        return [list(entry) for entry in self._toc]
+
+    def set_toc(self, toc):
+        """替换目录并更新缓存"""
+        self.doc.set_toc(toc)
+        self._toc = [list(entry) for entry in toc]
+        self._xref_count = None
+
+    def page(self, index):
+        return self.doc[index]
+
+    def page_text(self, index):
+        return self.doc[index].get_text("text")
+
+    def render_page(self, index, dpi=200):
+        """将单页渲染为 fitz.Pixmap（可直接调用 .save(path) 保存为 PNG）"""
+        return self.doc[index].get_pixmap(dpi=dpi, alpha=False)
+
+    def rendered_pages(self, dpi=200):
+        """按需渲染的页面序列，支持 len() 和下标访问，不会一次性把所有页面保存在内存中"""
+        return RenderedPages(self, dpi)
+
+    def save(self, output_path=None, incremental=False, **kwargs):
+        """保存文档；incremental=True 时原地增量保存"""
+        if incremental:
+            self.doc.save(self.path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        else:
+            self.doc.save(output_path or self.path, **kwargs)
+
+    def close(self):
+        if not self.doc.is_closed:
+            self.doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RenderedPages:
+    """PdfSession.rendered_pages 返回的按需渲染序列"""
+
+    def __init__(self, session, dpi):
+        self.session = session
+        self.dpi = dpi
+
+    def __len__(self):
+        return self.session.page_count
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return self.session.render_page(index % len(self), self.dpi)
+
+
+@contextmanager
+def use_session(source):
+    """
+    统一处理"路径或会话"参数
+
+    传入 PdfSession 时直接使用且不关闭；传入路径时打开新会话，退出时关闭。
+    """
+    if isinstance(source, PdfSession):
+        yield source
+    else:
+        session = PdfSession(source)
+        try:
+            yield session
+        finally:
+            session.close()
+
+
+def source_path(source):
+    """返回路径或会话对应的文件路径"""
+    return source.path if isinstance(source, PdfSession) else os.fspath(source)
@@ -1,80 +1,163 @@
 import os
-import re
-from PyPDF2 import PdfReader, PdfWriter
+import argparse
+import fitz  # PyMuPDF库，用于PDF处理
+from pdf_session import use_session, source_path
+from pdf_chapter_splitter import run_write_tasks
 
-def parse_page_range(page_range_str):
-    """解析页码范围字符串，返回一个包含所有页码的列表"""
-    pages = []
-    # 处理类似 "1,3-5,7" 的格式
+def parse_page_ranges(page_range_str):
+    """
+    解析页码范围字符串，返回区间列表
+
+    类似 "1,3-5,7" 的输入解析为 [range(0, 1), range(2, 5), range(6, 7)]（0 索引），
+    每个区间只保存起止位置，不会展开成逐页列表。格式错误时返回空列表。
+    """
+    ranges = []
     for part in page_range_str.split(','):
         part = part.strip()
-        if '-' in part:
-            # 处理范围，如 "3-5"
-            start, end = part.split('-')
-            try:
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                # 处理范围，如 "3-5"
+                start, end = part.split('-')
                 start = int(start.strip())
                 end = int(end.strip())
-                # 页码从 1 开始，所以需要调整为 0 索引
-                pages.extend(range(start - 1, end))
-            except ValueError:
-                print(f"无效的页码范围: {part}")
-                return []
-        else:
-            # 处理单个页码，如 "1"
-            try:
-                pages.append(int(part.strip()) - 1)
-            except ValueError:
-                print(f"无效的页码: {part}")
-                return []
-    return pages
-
-def split_pdf(input_path, output_base, page_ranges):
-    """根据指定的页码范围拆分 PDF 文件"""
+            else:
+                # 处理单个页码，如 "1"
+                start = end = int(part)
+        except ValueError:
+            print(f"无效的页码范围: {part}")
+            return []
+        # 页码从 1 开始，所以需要调整为 0 索引
+        ranges.append(range(start - 1, end))
+    return ranges
+
+def parse_page_range(page_range_str):
+    """解析页码范围字符串，返回一个包含所有页码的列表"""
+    return [page for r in parse_page_ranges(page_range_str) for page in r]
+
+def format_ranges(ranges):
+    """将区间列表格式化为 "1,3-5,7" 形式（1 索引）"""
+    return ','.join(str(r.start + 1) if len(r) == 1 else f"{r.start + 1}-{r.stop}" for r in ranges)
+
+def every_n_pages(total_pages, n):
+    """每 n 页拆分为一个部分"""
+    return [[range(start, min(start + n, total_pages))] for start in range(0, total_pages, n)]
+
+def equal_parts(total_pages, n):
+    """拆分为 n 个页数尽量相等的部分，空文档返回空列表"""
+    n = min(n, total_pages)
+    if n <= 0:
+        return []
+    size, extra = divmod(total_pages, n)
+    parts, start = [], 0
+    for i in range(n):
+        stop = start + size + (1 if i < extra else 0)
+        parts.append([range(start, stop)])
+        start = stop
+    return parts
+
+def is_blank_page(page, ink_threshold=0.002):
+    """
+    判断页面是否为空白页
+
+    有文字的页面不是空白页；既无文字也无图像和矢量图形的页面是空白页；
+    其余情况（如扫描页）以低分辨率灰度渲染，按深色像素比例判断。
+    """
+    if page.get_text("text").strip():
+        return False
+    if not page.get_images() and not page.get_drawings():
+        return True
+    pix = page.get_pixmap(dpi=20, colorspace=fitz.csGRAY, alpha=False)
+    dark = sum(1 for value in pix.samples if value < 200)
+    return dark <= ink_threshold * pix.width * pix.height
+
+def blank_page_parts(doc):
+    """在空白页处拆分，空白页本身不包含在任何部分中"""
+    parts, start = [], None
+    for page_num in range(doc.page_count):
+        if is_blank_page(doc[page_num]):
+            if start is not None:
+                parts.append([range(start, page_num)])
+                start = None
+        elif start is None:
+            start = page_num
+    if start is not None:
+        parts.append([range(start, doc.page_count)])
+    return parts
+
+def split_pdf(input_path, output_base, page_ranges=None, every=None, parts=None, blank=False, workers=None):
+    """
+    拆分 PDF 文件
+
+    只解析一次源文件，所有部分在同一遍中生成；部分较多时按页数分组交给进程池并行写入。
+
+    参数:
+    input_path (str): 输入 PDF 文件路径
+    output_base (str): 输出文件基本名称，生成 output_base_part{i}.pdf
+    page_ranges (list): 页码范围字符串列表，每项生成一个文件，如 ["1-3", "5,7-9"]
+    every (int): 每 N 页拆分为一个文件
+    parts (int): 拆分为 N 个页数相等的文件
+    blank (bool): 在空白页处拆分
+    workers (int): 并行写入的进程数，默认为CPU核数
+    input_path 可以是文件路径或 PdfSession。返回生成的文件数。
+    """
+    source, input_path = input_path, source_path(input_path)
+    workers = workers or os.cpu_count() or 1
     try:
-        # 读取原始 PDF
-        with open(input_path, 'rb') as file:
-            reader = PdfReader(file)
-            total_pages = len(reader.pages)
-            
-            # 为每个页码范围创建一个新的 PDF
-            for i, page_range in enumerate(page_ranges, 1):
-                pages = parse_page_range(page_range)
-                
-                # 验证页码是否有效
-                invalid_pages = [p + 1 for p in pages if p < 0 or p >= total_pages]
-                if invalid_pages:
-                    print(f"页码 {', '.join(map(str, invalid_pages))} 超出了 PDF 的总页数 {total_pages}")
-                    continue
-                
-                if not pages:
-                    print(f"忽略空的页码范围: {page_range}")
-                    continue
-                
-                # 创建写入器并添加选定的页面
-                writer = PdfWriter()
-                for page_num in pages:
-                    writer.add_page(reader.pages[page_num])
-                
-                # 生成输出文件名
-                output_filename = f"{output_base}_part{i}.pdf"
-                
-                # 写入新的 PDF 文件
-                with open(output_filename, 'wb') as output_file:
-                    writer.write(output_file)
-                
-                print(f"已创建: {output_filename}，包含页码: {', '.join(map(lambda x: str(x + 1), pages))}")
-    
+        with use_session(source) as session:
+            doc = session.doc
+            total_pages = session.page_count
+
+            if every:
+                part_ranges = every_n_pages(total_pages, every)
+            elif parts:
+                part_ranges = equal_parts(total_pages, parts)
+            elif blank:
+                part_ranges = blank_page_parts(doc)
+            else:
+                part_ranges = []
+                for page_range in page_ranges or []:
+                    ranges = [r for r in parse_page_ranges(page_range) if r]
+                    # 验证页码是否有效
+                    invalid = [r for r in ranges if r.start < 0 or r.stop > total_pages]
+                    if invalid:
+                        print(f"页码 {format_ranges(invalid)} 超出了 PDF 的总页数 {total_pages}")
+                        part_ranges.append(None)
+                        continue
+                    if not ranges:
+                        print(f"忽略空的页码范围: {page_range}")
+                        part_ranges.append(None)
+                        continue
+                    part_ranges.append(ranges)
+
+            tasks = [(ranges, f"{output_base}_part{i}.pdf")
+                     for i, ranges in enumerate(part_ranges, 1) if ranges]
+            if not tasks:
+                print("没有需要生成的文件")
+                return 0
+
+            run_write_tasks(doc, input_path, tasks, workers)
+
+        if len(tasks) <= 20:
+            for ranges, output_filename in tasks:
+                print(f"已创建: {output_filename}，包含页码: {format_ranges(ranges)}")
+        print(f"拆分完成! 共生成 {len(tasks)} 个文件")
+        return len(tasks)
+
     except FileNotFoundError:
         print(f"错误: 找不到文件 '{input_path}'")
     except Exception as e:
         print(f"发生错误: {e}")
+    return 0
 
-if __name__ == "__main__":
+def interactive():
+    """交互式拆分"""
     print("=== PDF 按页拆分工具 ===")
-    
+
     # 获取输入文件路径
     input_file = input("请输入要拆分的 PDF 文件路径: ").strip()
-    
+
     # 检查文件是否存在且为 PDF
     if not os.path.isfile(input_file):
         print(f"错误: 文件 '{input_file}' 不存在")
@@ -86,20 +169,53 @@ if __name__ == "__main__":
         output_base = input(f"请输入输出文件的基本名称 (默认: {file_base}_split): ").strip()
         if not output_base:
             output_base = f"{file_base}_split"
-        
+
         # 获取页码范围
         print("\n请输入要拆分的页码范围，格式示例:")
         print("  - 单个页码: 1")
         print("  - 连续页码: 3-5")
         print("  - 组合页码: 1,3-5,7")
         print("  - 多个范围用分号分隔: 1-3;5-7;10")
-        
+
         ranges_input = input("请输入页码范围: ").strip()
-        
+
         # 分割多个页码范围
         page_ranges = [r.strip() for r in ranges_input.split(';') if r.strip()]
-        
+
         if not page_ranges:
             print("错误: 未输入有效的页码范围")
         else:
-            split_pdf(input_file, output_base, page_ranges)    
\ No newline at end of file
+            split_pdf(input_file, output_base, page_ranges)
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF 按页拆分工具（不带参数运行时进入交互模式）')
+    parser.add_argument('pdf_path', help='PDF文件路径')
+    parser.add_argument('-o', '--output', help='输出文件基本名称，默认为"原文件名_split"')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-r', '--ranges', help='页码范围，多个文件用分号分隔，如 "1-3;5,7-9;10"')
+    group.add_argument('-e', '--every', type=int, help='每 N 页拆分为一个文件')
+    group.add_argument('-n', '--parts', type=int, help='拆分为 N 个页数相等的文件')
+    group.add_argument('-b', '--blank', action='store_true', help='在空白页处拆分')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='并行写入的进程数，默认为CPU核数')
+    # python pdf_splitter.py input.pdf -r "1-3;5-7;10"
+    # python pdf_splitter.py input.pdf -e 1 -o pages/page -j 8
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.pdf_path):
+        print(f"错误: 文件 '{args.pdf_path}' 不存在")
+        return
+    if args.every is not None and args.every < 1 or args.parts is not None and args.parts < 1:
+        print("错误: -e/-n 的值必须为正整数")
+        return
+
+    output_base = args.output or f"{os.path.splitext(args.pdf_path)[0]}_split"
+    page_ranges = [r.strip() for r in args.ranges.split(';') if r.strip()] if args.ranges else None
+    split_pdf(args.pdf_path, output_base, page_ranges, args.every, args.parts, args.blank, args.jobs)
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) == 1:
+        interactive()
+    else:
+        main()
@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from g4f.client import Client
+from tqdm import tqdm
+import gpt_ocr
+import gpt_translate
+from ocr_quality import assess_ocr, file_ink_coverage
+from outline import Outline
+from pdf_index import file_sha256
+from pdf_session import PdfSession
+from pdf2png import get_pdf_info, format_filename
+from tree2dir import long_path
+
+BUILD_DB = ".build.db"
+# 渲染方式变化（如改用其它渲染器或参数）时递增，使旧的渲染结果全部失效
+RENDER_VERSION = 1
+STAGES = ("render", "ocr", "translate")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    stage TEXT NOT NULL,
+    key TEXT NOT NULL,
+    output_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    built_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_key ON artifacts(stage, key);
+"""
+
+
+def build_key(*parts):
+    """由输入内容的哈希和参数计算产物的构建键"""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def page_fingerprint(doc, index):
+    """
+    计算单页内容的指纹：页面对象（尺寸、旋转、资源引用）、内容流和引用图像的原始数据
+
+    只修改书签或其它页面时该页的指纹不变。保存时重排 xref 编号会使指纹变化，
+    但重新渲染出的 PNG 与之前相同，下游的 OCR 和翻译仍按内容哈希复用。
+    """
+    page = doc[index]
+    digest = hashlib.sha256()
+    digest.update(doc.xref_object(page.xref, compressed=True).encode("utf-8"))
+    digest.update(page.read_contents())
+    for xref in sorted({image[0] for image in page.get_images(full=True)}):
+        digest.update(doc.xref_stream_raw(xref) or b"")
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    记录每个产物（渲染的页面、OCR 结果、译文）的构建键、内容哈希、大小和修改时间
+
+    构建键相同且文件未被改动的产物视为最新；构建键相同但路径不同（如调整书签后目录变化）的
+    产物可以直接复制复用。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def _is_intact(self, path, size, mtime):
+        try:
+            stat = os.stat(long_path(path))
+        except OSError:
+            return False
+        return stat.st_size == size and stat.st_mtime == mtime
+
+    def lookup(self, path, key):
+        """产物为最新时返回其内容哈希，否则返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT key, output_hash, size, mtime FROM artifacts WHERE path = ?",
+                                     (path,)).fetchone()
+        if row and row[0] == key and self._is_intact(path, row[2], row[3]):
+            return row[1]
+        return None
+
+    def find_reusable(self, stage, key, exclude=None):
+        """查找构建键相同且文件完好的其它产物（不含 exclude 本身），返回其路径"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size, mtime FROM artifacts WHERE stage = ? AND key = ?",
+                                      (stage, key)).fetchall()
+        for path, size, mtime in rows:
+            if exclude is not None and os.path.abspath(path) == os.path.abspath(exclude):
+                continue
+            if self._is_intact(path, size, mtime):
+                return path
+        return None
+
+    def record(self, path, stage, key):
+        """记录刚生成的产物，返回其内容哈希"""
+        output_hash = file_sha256(long_path(path))
+        stat = os.stat(long_path(path))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (path, stage, key, output_hash, size, mtime, built_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, stage, key, output_hash, stat.st_size, stat.st_mtime, time.time())
+            )
+            self._conn.commit()
+        return output_hash
+
+    def paths(self):
+        with self._lock:
+            return {path for path, in self._conn.execute("SELECT path FROM artifacts")}
+
+    def forget(self, paths):
+        with self._lock:
+            self._conn.executemany("DELETE FROM artifacts WHERE path = ?", [(path,) for path in paths])
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def build(manifest, stage, path, key, builder, force=False):
+    """
+    按需构建一个产物，返回 (状态, 内容哈希)
+
+    状态为 "skipped"（已是最新）、"reused"（从构建键相同的其它产物复制）或 "built"（调用 builder 重新生成）。
+    """
+    if not force:
+        output_hash = manifest.lookup(path, key)
+        if output_hash:
+            return "skipped", output_hash
+        source = manifest.find_reusable(stage, key, exclude=path)
+        if source:
+            shutil.copy2(long_path(source), long_path(path))
+            return "reused", manifest.record(path, stage, key)
+    builder(path)
+    return "built", manifest.record(path, stage, key)
+
+
+def write_text_atomic(path, text):
+    temp_path = path + ".part"
+    with open(long_path(temp_path), 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(long_path(temp_path), long_path(path))
+
+
+def run_pipeline(pdf_paths, output_dir, dpi=200, ocr_model=gpt_ocr.MODEL, translate=True, workers=8,
+                 translate_concurrency=4, memory=None, force=(), prune=False, progressive_dpi=None):
+    """
+    增量执行 PDF → PNG → OCR → 翻译 流水线
+
+    目录结构与 pdf2png.save_pngs 一致：<output_dir>/<书名>/<大纲路径>/<页码>.png，
+    OCR 结果为同名 .md，译文为 .zh.md。每个产物的构建键包含其输入的内容哈希和参数：
+    渲染为页面指纹和 DPI，OCR 为 PNG 哈希、模型和提示词，翻译为 Markdown 哈希、模型和提示词。
+    只有构建键变化的产物才会重新生成。
+
+    页面在主线程中依次渲染，每渲染完一页就把该页的 OCR 和翻译交给线程池，
+    因此不同页面的渲染、OCR 和翻译同时进行。
+    force 为需要强制重建的阶段名集合；prune=True 时删除本次未生成的旧产物（如书签调整后的旧目录），
+    只清理本次完整规划过的书的目录，同一输出目录中的其它书和本次处理出错的书不受影响。
+    产物路径一律以绝对路径记录，输出目录写成相对或绝对路径都对应同一组记录。
+
+    指定 progressive_dpi 时先以该（较低的）DPI 渲染和 OCR，按 ocr_quality.assess_ocr 检查结果，
+    公式密集、公式定界符不成对或相对墨迹量过短的页再以 dpi 重新渲染、识别后才翻译。
+    大多数正文页只需低分辨率，渲染时间和上传的数据量都更小。已升级为高分辨率的页之后不会再降回。
+    返回 {(阶段, 状态): 数量}。
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    force = set(force)
+    stats = Counter()
+    planned = set()
+    client = Client()
+
+    def render_page(session, index, dpi):
+        def builder(path):
+            temp_path = path + ".part"
+            session.render_page(index, dpi).save(long_path(temp_path), output="png")
+            os.replace(long_path(temp_path), long_path(path))
+        return builder
+
+    def ocr_page(png_path):
+        def builder(path):
+            write_text_atomic(path, gpt_ocr.ocr_image(long_path(png_path), client, ocr_model))
+        return builder
+
+    def translate_page(md_path):
+        def builder(path):
+            with open(long_path(md_path), 'r', encoding='utf-8') as f:
+                if not f.read().strip():
+                    write_text_atomic(path, "")
+                    return
+            # 有段落翻译失败时 process_markdown_file 返回 False 且不生成输出，抛出异常使该产物不被记录
+            if os.path.exists(long_path(path)):
+                os.remove(long_path(path))
+            if not gpt_translate.process_markdown_file(long_path(md_path), long_path(path),
+                                                       translate_concurrency, memory):
+                raise RuntimeError("翻译失败，有段落未翻译")
+        return builder
+
+    def process_page(png_path, png_hash, ink=None):
+        """
+        OCR 并翻译一页，返回 (各阶段的状态, 问题列表)
+
+        指定 ink（低分辨率页面的墨迹覆盖率）时先检查 OCR 结果，有问题则不翻译，返回问题列表以便重新渲染。
+        """
+        results = []
+        md_path = png_path[:-len(".png")] + ".md"
+        try:
+            status, md_hash = build(manifest, "ocr", md_path,
+                                    build_key("ocr", png_hash, ocr_model, gpt_ocr.OCR_PROMPT),
+                                    ocr_page(png_path), "ocr" in force)
+            results.append(("ocr", status))
+        except Exception as e:
+            print(f"OCR {png_path} 时出错: {e}")
+            return results + [("ocr", "failed")], None
+        if ink is not None:
+            with open(long_path(md_path), 'r', encoding='utf-8') as f:
+                reasons = assess_ocr(f.read(), ink)
+            if reasons:
+                return results, reasons
+        if translate:
+            zh_path = png_path[:-len(".png")] + ".zh.md"
+            try:
+                status, _ = build(manifest, "translate", zh_path,
+                                  build_key("translate", md_hash, gpt_translate.MODEL, gpt_translate.TRANSLATE_PROMPT),
+                                  translate_page(md_path), "translate" in force)
+                results.append(("translate", status))
+            except Exception as e:
+                print(f"翻译 {md_path} 时出错: {e}")
+                results.append(("translate", "failed"))
+        return results, None
+
+    with BuildManifest(os.path.join(output_dir, BUILD_DB)) as manifest, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        book_dirs = []  # 本次完整规划过的书的目录，只在这些目录中清理过期产物
+        for pdf_path in pdf_paths:
+            try:
+                with PdfSession(pdf_path) as session:
+                    info = get_pdf_info(session)
+                    outline = Outline.from_nested(info["Outline"], info["Pages"])
+                    book_dir = os.path.join(output_dir, format_filename(info["metadata"]["title"]))
+                    pages = []
+                    for index, path in enumerate(outline.paths(format_filename)):
+                        first, last = outline.own_range(index)
+                        pages.extend((os.path.join(book_dir, *path), page) for page in range(first - 1, last))
+                    for folder in dict.fromkeys(folder for folder, _ in pages):
+                        os.makedirs(long_path(folder), exist_ok=True)
+
+                    for folder, page in tqdm(pages, desc=f"渲染 {os.path.basename(pdf_path)}"):
+                        png_path = os.path.join(folder, f"{page}.png")
+                        planned.update((png_path, png_path[:-4] + ".md", png_path[:-4] + ".zh.md"))
+                        fingerprint = page_fingerprint(session.doc, page)
+                        ink = None
+                        try:
+                            png_hash = None
+                            if progressive_dpi and "render" not in force:
+                                # 之前已升级为高分辨率的页直接沿用
+                                png_hash = manifest.lookup(png_path, build_key("render", RENDER_VERSION, fingerprint, dpi))
+                                status = "skipped"
+                            if png_hash is None:
+                                render_dpi = progressive_dpi or dpi
+                                status, png_hash = build(manifest, "render", png_path,
+                                                         build_key("render", RENDER_VERSION, fingerprint, render_dpi),
+                                                         render_page(session, page, render_dpi), "render" in force)
+                                if progressive_dpi:
+                                    ink = file_ink_coverage(png_path)
+                        except Exception as e:
+                            print(f"渲染 {png_path} 时出错: {e}")
+                            stats["render", "failed"] += 1
+                            continue
+                        stats["render", status] += 1
+                        futures[executor.submit(process_page, png_path, png_hash, ink)] = (pdf_path, page, png_path)
+                    book_dirs.append(os.path.join(book_dir, ''))
+            except Exception as e:
+                print(f"处理 {pdf_path} 时出错: {e}")
+
+        upgrades = {}  # PDF 路径 -> [(页码, PNG 路径)]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="OCR/翻译"):
+            results, reasons = future.result()
+            for stage, status in results:
+                stats[stage, status] += 1
+            if reasons:
+                pdf_path, page, png_path = futures[future]
+                print(f"{png_path}: {'; '.join(reasons)}，以 {dpi} DPI 重新识别")
+                upgrades.setdefault(pdf_path, []).append((page, png_path))
+
+        if upgrades:
+            futures = []
+            for pdf_path, pages in upgrades.items():
+                try:
+                    with PdfSession(pdf_path) as session:
+                        for page, png_path in tqdm(sorted(pages), desc=f"重新渲染 {os.path.basename(pdf_path)}"):
+                            key = build_key("render", RENDER_VERSION, page_fingerprint(session.doc, page), dpi)
+                            try:
+                                status, png_hash = build(manifest, "render", png_path, key,
+                                                         render_page(session, page, dpi), "render" in force)
+                            except Exception as e:
+                                print(f"渲染 {png_path} 时出错: {e}")
+                                stats["render", "failed"] += 1
+                                continue
+                            stats["render", status] += 1
+                            futures.append(executor.submit(process_page, png_path, png_hash))
+                except Exception as e:
+                    print(f"处理 {pdf_path} 时出错: {e}")
+            for future in tqdm(as_completed(futures), total=len(futures), desc="高分辨率 OCR/翻译"):
+                for stage, status in future.result()[0]:
+                    stats[stage, status] += 1
+            print(f"{sum(len(pages) for pages in upgrades.values())} 页以 {dpi} DPI 重新识别")
+
+        orphaned = {path for path in manifest.paths() if os.path.abspath(path) not in planned
+                    and os.path.abspath(path).startswith(tuple(book_dirs))}
+        if orphaned and prune:
+            for path in orphaned:
+                try:
+                    os.remove(long_path(path))
+                except FileNotFoundError:
+                    pass
+            manifest.forget(orphaned)
+            print(f"已删除 {len(orphaned)} 个过期产物")
+        elif orphaned:
+            print(f"有 {len(orphaned)} 个过期产物未被本次构建使用，可加 --prune 删除")
+
+    labels = {"built": "重新生成", "reused": "复用", "skipped": "最新", "failed": "失败"}
+    for stage in STAGES:
+        counts = ", ".join(f"{labels[status]} {stats[stage, status]}" for status in labels if stats[stage, status])
+        print(f"{stage}: {counts or '无'}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PDF → PNG → OCR → 翻译 增量构建工具')
+    parser.add_argument('pdfs', nargs='+', help='PDF 文件路径')
+    parser.add_argument('-o', '--output', required=True, help='输出目录')
+    parser.add_argument('--dpi', type=int, default=200, help='渲染 DPI，默认为 200')
+    parser.add_argument('--progressive', type=int, metavar='DPI',
+                        help='先以该 DPI 渲染和 OCR，结果不佳的页再以 --dpi 重新识别，如 --progressive 100 --dpi 300')
+    parser.add_argument('--ocr-model', default=gpt_ocr.MODEL, help=f'OCR 模型，默认为 {gpt_ocr.MODEL}')
+    parser.add_argument('--no-translate', action='store_true', help='只渲染和 OCR，不翻译')
+    parser.add_argument('-j', '--jobs', type=int, default=8, help='同时处理的页面数，默认为 8')
+    parser.add_argument('-t', '--threads', type=int, default=4, help='翻译单页时的并发请求数，默认为 4')
+    parser.add_argument('-m', '--memory', default='translation_memory.db', help='翻译记忆数据库路径')
+    parser.add_argument('--no-memory', action='store_true', help='不使用翻译记忆')
+    parser.add_argument('--force', action='append', choices=STAGES, default=[], help='强制重建指定阶段，可重复指定')
+    parser.add_argument('--prune', action='store_true', help='删除本次构建未使用的过期产物')
+    # python pipeline.py book.pdf -o D:\output -j 8
+    # python pipeline.py book.pdf -o D:\output --force translate
+    # python pipeline.py book.pdf -o D:\output --progressive 100 --dpi 300
+    args = parser.parse_args()
+
+    memory = None if args.no_memory else gpt_translate.TranslationMemory(args.memory)
+    try:
+        run_pipeline(args.pdfs, args.output, args.dpi, args.ocr_model, not args.no_translate, args.jobs,
+                     args.threads, memory, args.force, args.prune, args.progressive)
+    finally:
+        if memory is not None:
+            memory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,14 @@ import asyncio
 import base64
 import shutil
 import re
-import sys
 import time
+import argparse
 
-import aiohttp
 import g4f.api
 
+from ocr_scheduler import OcrScheduler, page_number
+from endpoint_pool import EndpointPool, DEFAULT_ENDPOINTS
+
 
 def traverse_folder_manually(folder_path, file_list=None):
     if file_list is None:
@@ -25,16 +27,14 @@ def traverse_folder_manually(folder_path, file_list=None):
         print(f"没有权限访问 {folder_path}")
     return file_list
 
-async def kimi_ocr(image_path,output_path):
-    print("requesting: "+image_path)
-    with open(image_path, 'rb') as file:
-        base64_image = base64.b64encode(file.read()).decode('utf-8')
-
+MODEL = "gpt-4.1"
+OCR_PROMPT = "只识别图片内容为markdown格式，翻译为中文，不要总结，不要介绍，行内公式用 $ 表示，行间公式用 $$ 表示，公式序号用\\tag表示"
 
 
-    api_url = 'http://127.0.0.1:1337/v1/chat/completions'
-    request_data = {
-        "model":"gpt-4.1",
+def build_ocr_request(image_bytes, model=MODEL, prompt=OCR_PROMPT):
+    base64_image = base64.b64encode(image_bytes).decode('utf-8')
+    return {
+        "model": model,
         "messages": [
             {
                 "role": "user",
@@ -47,27 +47,72 @@ async def kimi_ocr(image_path,output_path):
                     },
                     {
                         "type": "text",
-                        "text": "只识别图片内容为markdown格式，翻译为中文，不要总结，不要介绍，行内公式用 $ 表示，行间公式用 $$ 表示，公式序号用\\tag表示"
+                        "text": prompt
                     }
                 ]
             }
         ],
         "use_search": False
     }
-    timeout = aiohttp.ClientTimeout(total=600)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        async with session.post(api_url, json=request_data) as response:
-            response_data = await response.json()
-            print(response_data)
-            result= response_data['choices'][0]['message']['content']
-            match = re.search(r'```markdown\n(.*?)```', result, re.DOTALL)
-            if match:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(match.group(1))
-            else:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(result)
-            print("save to:", output_path)
+
+
+async def request_ocr(image_bytes, pool=None):
+    """
+    发送OCR请求，返回识别出的Markdown文本（去掉 ```markdown 代码块包裹）
+
+    pool 为 endpoint_pool.EndpointPool，在多个端点间按延迟路由并对慢请求发送备份请求；
+    未指定时临时使用默认端点。
+    """
+    if pool is None:
+        async with EndpointPool() as pool:
+            return await request_ocr(image_bytes, pool)
+    response_data = await pool.request(build_ocr_request(image_bytes))
+    print(response_data)
+    result= response_data['choices'][0]['message']['content']
+    match = re.search(r'```markdown\n(.*?)```', result, re.DOTALL)
+    return match.group(1) if match else result
+
+
+async def ocr_image(image_path, pool=None):
+    """OCR 单张图片，返回识别出的Markdown文本"""
+    with open(image_path, 'rb') as file:
+        return await request_ocr(file.read(), pool)
+
+
+async def kimi_ocr(image_path,output_path,pool=None):
+    print("requesting: "+image_path)
+    content = await ocr_image(image_path, pool)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    print("save to:", output_path)
+
+
+async def ocr_store_page(store, book, page, pool=None):
+    print(f"requesting: {book} 第 {page} 页")
+    content = await request_ocr(store.get(book, page, "png"), pool)
+    store.put(book, page, "ocr", content)
+    print(f"saved: {book} 第 {page} 页")
+
+
+async def ocr_store(store, books=None, endpoints=None):
+    """
+    对页面仓库（page_store.PageStore）中还没有OCR结果的页面发送请求，结果写回仓库
+
+    与 main 相同，每秒发起一个请求；失败的页面不写入，下次运行时会重新处理。
+    """
+    async with EndpointPool(endpoints) as pool:
+        request_task = []
+        for book in books or store.books():
+            for page in store.missing(book, "ocr", "png"):
+                request_task.append(asyncio.create_task(ocr_store_page(store, book, page, pool)))
+                await asyncio.sleep(1)
+
+        for task_obj in request_task:
+            try:
+                await task_obj
+            except Exception as e:
+                print(f"OCR 请求失败: {e}")
+        print(pool.summary())
 
 
 def copy_directory(source_dir, destination_dir):
@@ -84,31 +129,84 @@ def copy_directory(source_dir, destination_dir):
                 copy_directory(s, d)
             else:
                 shutil.copy2(s, d)
-async def main(png_package_path_set,output_dir):
+async def ocr_worker(scheduler, start_lock, pool, interval=1):
+    """从调度器中按优先级取任务；通过 start_lock 让各请求的发起间隔 interval 秒"""
+    while True:
+        job = scheduler.get(block=False)
+        if job is None:
+            return
+        png_path, write_path = job.item
+        async with start_lock:
+            await asyncio.sleep(interval)
+        try:
+            await kimi_ocr(png_path, write_path, pool)
+            scheduler.task_done(job)
+        except Exception as e:
+            print(f"OCR 请求失败 {png_path}: {e}")
+            scheduler.task_done(job, False)
+
+
+async def main(png_package_path_set,output_dir,concurrency=16,boost_chapters=None,endpoints=None):
+    """
+    OCR 多本书的页面
+
+    所有书的页面交给同一个调度器（ocr_scheduler.OcrScheduler）：每本书按页码顺序处理，
+    多本书轮流取任务，boost_chapters 中的章节（相对书根目录的大纲路径）优先；
+    某一章全部完成时立即提示，不必等整本书结束。
+    endpoints 为多个 OpenAI 兼容端点的 URL，请求按延迟路由，慢请求会发送备份请求。
+    """
 
     time.sleep(2)
     os.makedirs(output_dir, exist_ok=True)
 
+    scheduler = OcrScheduler(on_chapter_done=lambda book, chapter: print(f"章节完成: {book} / {chapter or '.'}"))
     for png_package_path in png_package_path_set.split(","):
-        png_package_path.replace('"','').replace("'",'')
+        png_package_path = png_package_path.replace('"','').replace("'",'')
         png_package_name = os.path.basename(png_package_path)
         os.makedirs(output_dir+"\\" + png_package_name,exist_ok=True)
         target_dir = output_dir+"\\" + png_package_name
         copy_directory(png_package_path, target_dir)
-        request_task= []
         for folder in traverse_folder_manually(target_dir):
+            if not folder.endswith(".png"):
+                continue
             write_path = folder.replace(".png",".md")
             if not os.path.exists(write_path):
-                task_obj = asyncio.create_task(kimi_ocr(folder,write_path))
-                request_task.append(task_obj)
-                await asyncio.sleep(1)
+                page = page_number(folder)
+                chapter = os.path.relpath(os.path.dirname(folder), target_dir)
+                scheduler.submit(png_package_name, (folder, write_path),
+                                 order=(page is None, page or 0, folder), chapter=chapter, page=page)
             else:
                 print("file exists:", write_path)
+        for chapter in boost_chapters or []:
+            scheduler.boost(png_package_name, chapter=os.path.normpath(chapter))
+    scheduler.close()
 
-        for task_obj in request_task:
-            await task_obj
+    start_lock = asyncio.Lock()
+    async with EndpointPool(endpoints) as pool:
+        await asyncio.gather(*(ocr_worker(scheduler, start_lock, pool) for _ in range(concurrency)))
+        print(pool.summary())
 
 
 if __name__ == "__main__":
-    asyncio.run(main(sys.argv[1],sys.argv[2]))
-    # python 
+    parser = argparse.ArgumentParser(description='PNG 页面 OCR 为 Markdown')
+    parser.add_argument('png_package_path_set', nargs='?', help='PNG 目录（pdf2png 的输出），多个目录用逗号分隔')
+    parser.add_argument('output_dir', nargs='?', help='输出目录')
+    parser.add_argument('--store', help='改为处理页面仓库（page_store）中尚未 OCR 的页面')
+    parser.add_argument('--book', action='append', help='仓库模式下只处理指定的书，可重复指定')
+    parser.add_argument('-e', '--endpoint', action='append',
+                        help=f'OpenAI 兼容的 chat/completions 端点，可重复指定，默认为 {DEFAULT_ENDPOINTS[0]}')
+    parser.add_argument('-j', '--concurrency', type=int, default=16, help='同时进行的请求数，默认为 16')
+    parser.add_argument('-b', '--boost', action='append', help='优先处理的章节（相对书根目录的路径），可重复指定')
+    # python png2md.py "D:\output\book" D:\md_output
+    # python png2md.py "D:\output\book" D:\md_output -e http://127.0.0.1:1337/v1/chat/completions -e http://10.0.0.2:1337/v1/chat/completions
+    # python png2md.py --store pages.db --book 书名
+    args = parser.parse_args()
+
+    if args.store:
+        from page_store import PageStore
+        with PageStore(args.store) as page_store:
+            asyncio.run(ocr_store(page_store, args.book, args.endpoint))
+    elif args.png_package_path_set and args.output_dir:
+        asyncio.run(main(args.png_package_path_set, args.output_dir, args.concurrency, args.boost, args.endpoint))
+    else:
+        parser.print_help()
@@ -1,52 +1,276 @@
+import os
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 from PIL import Image
-import sys
+from tqdm import tqdm
 
-def remove_color(input_path, output_path, target_color=(23, 36, 41)):
+# 注意：这里的颜色值应为RGB格式，而不是16进制
+# 232429（16进制）转换为RGB约为 (35, 36, 41)
+# 但根据用户可能的输入错误，这里使用类似的深色值
+DEFAULT_COLOR = (23, 36, 41)
+DEFAULT_TOLERANCE = 30
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+# 超过该像素数的图像自动使用分条处理
+LARGE_IMAGE_PIXELS = 64 * 1024 * 1024
+DEFAULT_STRIP_HEIGHT = 512
+
+# 海报级扫描图会超过 Pillow 的解压炸弹阈值，这里处理的都是自己的图像，取消该限制
+Image.MAX_IMAGE_PIXELS = None
+
+
+def parse_color(text):
+    """解析颜色，支持 "23,36,41" 和 "#172429" 两种写法"""
+    text = text.strip()
+    if text.startswith('#'):
+        if len(text) != 7:
+            raise ValueError(f"无效的颜色: {text}")
+        return tuple(int(text[i:i + 2], 16) for i in (1, 3, 5))
+    parts = [int(part) for part in text.split(',')]
+    if len(parts) != 3 or not all(0 <= part <= 255 for part in parts):
+        raise ValueError(f"无效的颜色: {text}")
+    return tuple(parts)
+
+
+def color_mask(rgb, target_colors, tolerance=DEFAULT_TOLERANCE):
+    """
+    计算与任一目标颜色相近的像素掩码
+
+    与原逐像素实现相同：R、G、B 三个通道与目标颜色之差的绝对值都小于 tolerance 时视为匹配。
+    """
+    rgb = rgb.astype(np.int16)
+    mask = np.zeros(rgb.shape[:-1], dtype=bool)
+    for color in target_colors:
+        mask |= (np.abs(rgb - np.array(color, dtype=np.int16)) < tolerance).all(axis=-1)
+    return mask
+
+
+def build_color_lut(target_colors, tolerance=DEFAULT_TOLERANCE):
+    """
+    预计算颜色查找表：lut[r, g, b] 为 True 表示该颜色需要移除
+
+    查找表大小固定为 256×256×256（16 MB），逐像素只需一次查表，
+    耗时与目标颜色的数量无关。
+    """
+    lut = np.zeros((256, 256, 256), dtype=bool)
+    for r, g, b in target_colors:
+        lut[max(r - tolerance + 1, 0):min(r + tolerance, 256),
+            max(g - tolerance + 1, 0):min(g + tolerance, 256),
+            max(b - tolerance + 1, 0):min(b + tolerance, 256)] = True
+    return lut
+
+
+def lut_mask(rgb, lut):
+    """用查找表计算像素掩码"""
+    return lut[rgb[..., 0], rgb[..., 1], rgb[..., 2]]
+
+
+# 未压缩的像素格式每像素的位数，用于计算行跨度
+RAW_BITS = {"1": 1, "L": 8, "P": 8, "LA": 16, "RGB": 24, "BGR": 24, "RGBA": 32, "BGRA": 32, "RGBX": 32,
+            "BGRX": 32, "CMYK": 32}
+
+
+def raw_strip_layout(img, file_size):
+    """
+    返回未压缩图像（BMP、未压缩 TIFF、PPM 等，tile 为整行宽的 raw）各段像素数据在文件中的位置
+
+    结果为 [(起始行, 结束行, 偏移, rawmode, 行跨度, 方向)]，只读取公开的 img.tile，不修改图像对象；
+    图像不是这种格式或数据超出文件末尾时返回 None。
+    """
+    width = img.size[0]
+    layout = []
+    for tile in img.tile:
+        name, (x0, y0, x1, y1), offset, args = tile
+        if name != "raw" or x0 != 0 or x1 != width or not isinstance(args, tuple) or len(args) != 3:
+            return None
+        rawmode, stride, orientation = args
+        if orientation not in (1, -1):  # -1 为自下而上存储（如 BMP）
+            return None
+        if not stride:
+            bits = RAW_BITS.get(rawmode)
+            if bits is None:
+                return None
+            stride = (width * bits + 7) // 8
+        if offset + (y1 - y0) * stride > file_size:
+            return None
+        layout.append((y0, y1, offset, rawmode, stride, orientation))
+    return layout
+
+
+def iter_strips(input_path, strip_height):
+    """
+    逐条返回 (起始行, 该条的图像)
+
+    未压缩图像把文件映射为 np.memmap，每条只按偏移和行跨度取出对应的行，用 Image.frombuffer 解码；
+    PNG、JPEG 等整幅为一个压缩流的图像无法分段解码，只能以原有模式（RGB 每像素 3 字节、
+    L/P 每像素 1 字节）整体解码一次，再逐条取出。
+    """
+    with Image.open(input_path) as img:
+        width, height = img.size
+        mode = img.mode
+        layout = raw_strip_layout(img, os.path.getsize(input_path))
+        if layout is None:
+            img.load()
+            for top in range(0, height, strip_height):
+                yield top, img.crop((0, top, width, min(top + strip_height, height)))
+            return
+        palette = img.palette if mode == "P" else None
+        transparency = img.info.get("transparency")
+
+    data = np.memmap(input_path, dtype=np.uint8, mode='r')
+    try:
+        for top in range(0, height, strip_height):
+            bottom = min(top + strip_height, height)
+            strip_image = Image.new(mode, (width, bottom - top))
+            for y0, y1, offset, rawmode, stride, orientation in layout:
+                start, end = max(y0, top), min(y1, bottom)
+                if start >= end:
+                    continue
+                if orientation == 1:
+                    band_offset = offset + (start - y0) * stride
+                else:
+                    band_offset = offset + (y1 - end) * stride
+                rows = data[band_offset:band_offset + (end - start) * stride]
+                piece = Image.frombuffer(mode, (width, end - start), rows, "raw", rawmode, stride, orientation)
+                strip_image.paste(piece, (0, start - top))
+            if palette is not None:
+                strip_image.putpalette(palette)
+            if transparency is not None:
+                strip_image.info["transparency"] = transparency
+            yield top, strip_image
+    finally:
+        del data
+
+
+def remove_color_tiled(input_path, output_path, target_colors=None, tolerance=DEFAULT_TOLERANCE,
+                       strip_height=DEFAULT_STRIP_HEIGHT, temp_dir=None):
+    """
+    分条处理超大图像
+
+    每次只把 strip_height 行转换为 RGBA 并查表处理，结果写入磁盘上的内存映射缓冲区，
+    最后直接以该缓冲区为底层数据编码为 PNG，不会在内存中生成完整的 RGBA 副本。
+    未压缩的源图像（BMP、未压缩 TIFF 等）也逐条读取，内存占用只与条高有关；
+    PNG、JPEG 等压缩图像只能整体解码，源图像按原有模式占用一份内存（见 iter_strips）。
+    """
+    colors = target_colors or [DEFAULT_COLOR]
+    lut = build_color_lut(colors, tolerance)
+    temp_dir = temp_dir or os.path.dirname(os.path.abspath(output_path))
+    buffer_file = None
+    try:
+        with Image.open(input_path) as img:
+            width, height = img.size
+        fd, buffer_file = tempfile.mkstemp(suffix=".rgba", dir=temp_dir)
+        os.close(fd)
+        output = np.memmap(buffer_file, dtype=np.uint8, mode='w+', shape=(height, width, 4))
+        for top, strip_image in iter_strips(input_path, strip_height):
+            strip = np.array(strip_image.convert("RGBA"))
+            strip[..., 3][lut_mask(strip, lut)] = 0
+            output[top:top + strip.shape[0]] = strip
+        output.flush()
+
+        Image.frombuffer("RGBA", (width, height), output, "raw", "RGBA", 0, 1).save(output_path, "PNG")
+        del output
+        print(f"已分条处理图像并保存至 {output_path}")
+        return True
+
+    except Exception as e:
+        print(f"处理图像时出错: {e}")
+        return False
+    finally:
+        if buffer_file and os.path.exists(buffer_file):
+            try:
+                os.remove(buffer_file)
+            except OSError:
+                pass
+
+
+def remove_color(input_path, output_path, target_color=DEFAULT_COLOR, tolerance=DEFAULT_TOLERANCE,
+                 target_colors=None, strip_height=None):
     """
     从图像中移除指定颜色的像素，将其变为透明
-    
+
     参数:
     input_path (str): 输入图像路径
     output_path (str): 输出图像路径
     target_color (tuple): 要移除的颜色，默认为RGB(23, 36, 41)
+    tolerance (int): 每个通道允许的偏差（不含），默认为 30
+    target_colors (list): 要移除的多个颜色，指定时忽略 target_color
+    strip_height (int): 指定时分条处理；未指定时超过 LARGE_IMAGE_PIXELS 的图像自动分条处理
     """
+    colors = target_colors or [target_color]
     try:
         # 打开图像
         with Image.open(input_path) as img:
-            # 转换为RGBA模式以支持透明度
-            img = img.convert("RGBA")
             width, height = img.size
+            tiled = bool(strip_height) or width * height > LARGE_IMAGE_PIXELS
+            if not tiled:
+                # 转换为RGBA模式以支持透明度
+                pixels = np.array(img.convert("RGBA"))
+        if tiled:
+            return remove_color_tiled(input_path, output_path, colors, tolerance,
+                                      strip_height or DEFAULT_STRIP_HEIGHT)
 
-            # 获取像素数据
-            pixels = img.load()
+        # 将目标颜色像素设为透明（颜色较多时改用查找表，耗时与颜色数量无关）
+        if len(colors) > 2:
+            mask = lut_mask(pixels, build_color_lut(colors, tolerance))
+        else:
+            mask = color_mask(pixels[..., :3], colors, tolerance)
+        pixels[..., 3][mask] = 0
 
-            # 遍历所有像素
-            for y in range(height):
-                for x in range(width):
-                    r, g, b, a = pixels[x, y]
-                    # 检查是否为目标颜色（允许轻微偏差）
-                    if (abs(r - target_color[0]) < 30 and
-                            abs(g - target_color[1]) < 30 and
-                            abs(b - target_color[2]) < 30):
-                        # 将目标颜色像素设为透明
-                        pixels[x, y] = (r, g, b, 0)
-
-            # 保存修改后的图像
-            img.save(output_path, "PNG")
-            print(f"已处理图像并保存至 {output_path}")
+        # 保存修改后的图像
+        Image.fromarray(pixels, "RGBA").save(output_path, "PNG")
+        print(f"已处理图像并保存至 {output_path}")
+        return True
 
     except Exception as e:
         print(f"处理图像时出错: {e}")
+        return False
 
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("用法: python remove_color.py 输入图片路径 输出图片路径")
-        sys.exit(1)
 
-    input_image = sys.argv[1]
-    output_image = sys.argv[2]
+def remove_color_batch(input_dir, output_dir, target_colors=None, tolerance=DEFAULT_TOLERANCE, workers=None,
+                       strip_height=None):
+    """
+    批量处理目录中的图像，多个文件在进程池中并行处理
+
+    输出文件与输入同名（扩展名改为 .png），保存在 output_dir 中。返回成功处理的文件数。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(os.path.join(input_dir, name), os.path.join(output_dir, os.path.splitext(name)[0] + ".png"))
+            for name in sorted(os.listdir(input_dir)) if name.lower().endswith(IMAGE_EXTENSIONS)]
+    if not jobs:
+        print(f"错误: 目录 '{input_dir}' 中未找到图像文件")
+        return 0
+
+    colors = target_colors or [DEFAULT_COLOR]
+    success = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(remove_color, input_path, output_path, tolerance=tolerance,
+                                   target_colors=colors, strip_height=strip_height)
+                   for input_path, output_path in jobs]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="处理进度"):
+            success += bool(future.result())
+    print(f"处理完成！成功: {success}, 失败: {len(jobs) - success}")
+    return success
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='将图像中指定颜色的像素变为透明')
+    parser.add_argument('input', help='输入图片路径或图片目录')
+    parser.add_argument('output', help='输出图片路径或输出目录')
+    parser.add_argument('-c', '--color', action='append', type=parse_color,
+                        help='要移除的颜色，如 "23,36,41" 或 "#172429"，可重复指定，默认为 23,36,41')
+    parser.add_argument('-t', '--tolerance', type=int, default=DEFAULT_TOLERANCE, help='每个通道允许的偏差，默认为 30')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='目录模式下的并行进程数，默认为CPU核数')
+    parser.add_argument('-s', '--strip', type=int, default=None,
+                        help='分条处理时每条的行数；不指定时超过 64M 像素的图像自动按 512 行分条')
+    # python remove_color.py input.png output.png
+    # python remove_color.py input_dir output_dir -c 23,36,41 -c "#ffffff" -t 20 -j 8
+    # python remove_color.py poster.png poster_out.png -s 256
+    args = parser.parse_args()
 
-    # 注意：这里的颜色值应为RGB格式，而不是16进制
-    # 232429（16进制）转换为RGB约为 (35, 36, 41)
-    # 但根据用户可能的输入错误，这里使用类似的深色值
-    remove_color(input_image, output_image, target_color=(23, 36, 41))
\ No newline at end of file
+    colors = args.color or [DEFAULT_COLOR]
+    if os.path.isdir(args.input):
+        remove_color_batch(args.input, args.output, colors, args.tolerance, args.jobs, args.strip)
+    else:
+        remove_color(args.input, args.output, tolerance=args.tolerance, target_colors=colors, strip_height=args.strip)
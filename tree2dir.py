@@ -1,89 +1,112 @@
 import os
 import re
+import argparse
+from collections import deque
+from outline import Outline
 
-def create_chapter_index_directories(content, root_path):
+def long_path(path):
+    """Windows 下为绝对路径加上 \\\\?\\ 前缀以支持超过 260 个字符的路径"""
+    if os.name == 'nt':
+        path = os.path.abspath(path)
+        if not path.startswith('\\\\?\\'):
+            return '\\\\?\\' + path
+    return path
+
+def parse_outline(content):
+    """
+    将缩进表示层级的目录文本解析为目录树
+
+    每行格式为 "标题@页码"（页码不参与命名，可省略），2个空格为一级缩进。
+    返回根节点列表，每个节点为 {"name": "[序号] 标题", "children": [...]}，序号为该节点在同级中的位置。
+    """
+    outline = Outline.parse(content, strict=False)
+    roots = []
+    nodes = []
+    for index, title in enumerate(outline.titles):
+        parent = outline.parents[index]
+        siblings = nodes[parent]["children"] if parent >= 0 else roots
+        # 处理标题中的特殊字符
+        safe_title = re.sub(r'[\/:*?"<>|]', '-', title)
+        node = {"name": f"[{len(siblings) + 1}] {safe_title}", "children": []}
+        siblings.append(node)
+        nodes.append(node)
+    return roots
+
+def list_subdirectories(path):
+    """一次 scandir 读取目录下已有的子目录名"""
+    try:
+        with os.scandir(long_path(path)) as entries:
+            return {entry.name for entry in entries if entry.is_dir()}
+    except FileNotFoundError:
+        return set()
+
+def plan_directories(tree, root_path):
+    """
+    对比目录树和磁盘上已有的目录，返回需要创建的目录列表（父目录在前）
+
+    只对已存在的目录各做一次 scandir；父目录需要新建时，其下所有目录必然缺失，不再访问磁盘。
+    """
+    plan = []
+    root_exists = os.path.isdir(long_path(root_path))
+    if not root_exists:
+        plan.append(root_path)
+
+    queue = deque([(tree, root_path, root_exists)])
+    while queue:
+        nodes, parent_path, parent_exists = queue.popleft()
+        existing = list_subdirectories(parent_path) if parent_exists else set()
+        for node in nodes:
+            path = os.path.join(parent_path, node["name"])
+            exists = node["name"] in existing
+            if not exists:
+                plan.append(path)
+            if node["children"]:
+                queue.append((node["children"], path, exists))
+    # 按层遍历，父目录一定先于子目录加入计划
+    return plan
+
+def apply_plan(plan):
+    """按顺序创建目录；父目录已在之前创建，因此每个目录只需一次 mkdir 调用"""
+    for path in plan:
+        try:
+            os.mkdir(long_path(path))
+        except FileExistsError:
+            pass
+
+def create_chapter_index_directories(content, root_path, dry_run=False, verbose=False):
     """
     按章节在同级目录中的序号（index）创建文件夹，支持任意层级嵌套
-    
+
     参数:
         content: 包含层级目录的字符串（缩进表示层级）
         root_path: 根目录路径
+        dry_run: 只打印需要创建的目录，不实际创建
+        verbose: 打印每个需要创建的目录
+    返回需要创建（或已创建）的目录列表。
     """
-    # 确保根目录存在
-    if not os.path.exists(root_path):
-        os.makedirs(root_path)
-        print(f"创建根目录: {root_path}")
-    
-    # 解析每一行，获取层级、标题和页码（页码仅用于原始信息保留，不参与命名）
-    items = []
-    for line in content.split('\n'):
-        line = line.strip('\n').rstrip()
-        if not line:
-            continue
-        
-        # 计算层级（2个空格=1级）
-        indent_count = len(line) - len(line.lstrip(' '))
-        level = indent_count // 2
-        text = line.lstrip(' ')
-        
-        # 分离标题和页码（页码不影响命名，仅作为原始信息）
-        if '@' in text:
-            title = text.split('@', 1)[0].strip()
-        else:
-            title = text.strip()
-        
-        # 处理标题中的特殊字符
-        safe_title = re.sub(r'[\/:*?"<>|]', '-', title)
-        items.append((level, safe_title))
-    
-    # 递归创建目录，同时跟踪同级目录的序号（index）
-    def build_hierarchy(items, index=0, current_level=0, parent_path=root_path, sibling_count=None):
-        """
-        递归构建目录结构，sibling_count用于跟踪当前层级的兄弟节点数量（序号）
-        """
-        # 初始化当前层级的兄弟节点计数器（从1开始）
-        if sibling_count is None:
-            sibling_count = 1
-        
-        while index < len(items):
-            item_level, item_title = items[index]
-            
-            if item_level == current_level:
-                # 当前层级的节点：用同级序号命名
-                dir_name = f"[{sibling_count}] {item_title}"
-                current_path = os.path.join(parent_path, dir_name)
-                
-                if not os.path.exists(current_path):
-                    os.makedirs('\\?\\' +current_path)
-                    print(f"创建目录: {current_path}")
-                else:
-                    print(f"目录已存在: {current_path}")
-                
-                # 序号+1，处理下一个同级节点
-                sibling_count += 1
-                index += 1
-            
-            elif item_level > current_level:
-                # 子层级节点：递归创建，重置子层级的序号为1
-                index = build_hierarchy(
-                    items,
-                    index=index,
-                    current_level=item_level,
-                    parent_path=current_path,
-                    sibling_count=1  # 子层级从1开始计数
-                )
-            
-            else:
-                # 回到上一级：返回当前index，让父级继续处理
-                return index
-        
-        return index  # 所有节点处理完毕
-    
-    # 开始构建目录
-    build_hierarchy(items)
-    print("\n所有层级目录创建完成!")
+    tree = parse_outline(content)
+    plan = plan_directories(tree, root_path)
+
+    if dry_run or verbose:
+        for path in plan:
+            print(f"{'将创建' if dry_run else '创建目录'}: {path}")
+    if dry_run:
+        print(f"\n共需创建 {len(plan)} 个目录（未实际创建）")
+        return plan
+
+    apply_plan(plan)
+    print(f"\n所有层级目录创建完成! 新建 {len(plan)} 个目录")
+    return plan
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='按书签目录批量创建章节文件夹')
+    parser.add_argument('bookmarks', nargs='?', default='bookmarks.txt', help='书签文件路径，默认为 bookmarks.txt')
+    parser.add_argument('-o', '--root', default='../../note', help='根目录路径，默认为 ../../note')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='只显示需要创建的目录，不实际创建')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每个新建的目录')
+    # python tree2dir.py bookmarks.txt -o ../../note --dry-run
+    args = parser.parse_args()
 
-# 调用函数（使用原问题中的内容，也可替换为上面的测试内容）
-content = open('bookmarks.txt', 'r', encoding='utf-8').read()  # 从文件读取内容
-# 执行创建（支持任意层级）
-create_chapter_index_directories(content, root_path='../../note')
\ No newline at end of file
+    with open(args.bookmarks, 'r', encoding='utf-8') as f:
+        content = f.read()
+    create_chapter_index_directories(content, root_path=args.root, dry_run=args.dry_run, verbose=args.verbose)
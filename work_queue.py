@@ -0,0 +1,471 @@
+import os
+import json
+import asyncio
+import time
+import uuid
+import socket
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from ocr_scheduler import page_number
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    key TEXT,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'ready',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    visible_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_token TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (queue, key)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(queue, state, priority, id);
+"""
+
+
+class Lease:
+    """一次领取：任务内容和用于续租/提交的令牌"""
+
+    __slots__ = ("id", "payload", "attempts", "max_attempts", "token", "expires")
+
+    def __init__(self, job_id, payload, attempts, max_attempts, token, expires):
+        self.id = job_id
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.token = token
+        self.expires = expires
+
+    def __repr__(self):
+        return f"Lease({self.id}, attempts={self.attempts})"
+
+
+class LeaseLost(Exception):
+    """租约已过期并被其它工作进程领取"""
+
+
+class WorkQueue:
+    """
+    基于 SQLite 的持久化任务队列，可放在共享目录中供多台机器上的多个工作进程同时使用
+
+    工作进程用 BEGIN IMMEDIATE 事务原子地领取任务并获得租约（lease），处理期间定期续租（heartbeat）；
+    租约超过可见性超时（visibility_timeout）仍未续租的任务视为被放弃，下次领取时自动收回。
+    处理失败的任务按指数退避重新排队，尝试次数达到 max_attempts 后转入死信（state = 'dead'）。
+    提交和续租都要求令牌匹配，租约被收回后原工作进程的迟到结果会被拒绝。
+
+    使用回滚日志而不是 WAL，因为 WAL 依赖共享内存，不能用于网络文件系统；
+    共享目录需要支持文件锁（NFS 需正确配置 lockd，SMB 一般可以）。
+    """
+
+    def __init__(self, db_path="work_queue.db", queue="ocr", visibility_timeout=300, max_attempts=5,
+                 retry_delay=30):
+        self.db_path = db_path
+        self.root = os.path.dirname(os.path.abspath(db_path))
+        self.queue = queue
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, sql_steps):
+        """在 BEGIN IMMEDIATE 事务中执行 sql_steps(conn)，立即取得写锁，避免两个进程领到同一个任务"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = sql_steps(self._conn)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                # COMMIT 也可能因锁超时失败，此时事务仍未结束
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def enqueue(self, payload, key=None, priority=0):
+        """加入一个任务，key 相同的任务只保留一个；返回任务 id，已存在时返回 None"""
+        return self.enqueue_many([(payload, key, priority)])[0]
+
+    def enqueue_many(self, items, force=False):
+        """
+        批量加入 (payload, key, priority)，在一个事务中完成
+
+        force=True 时 key 已存在的任务用新的内容覆盖并重新排队（尝试次数清零），正在租出的任务不受影响。
+        """
+        now = time.time()
+        sql = ("INSERT INTO jobs (queue, key, payload, priority, max_attempts, visible_at, created, updated) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+        if force:
+            sql += (" ON CONFLICT (queue, key) DO UPDATE SET payload = excluded.payload, priority = excluded.priority, "
+                    "state = 'ready', attempts = 0, max_attempts = excluded.max_attempts, "
+                    "visible_at = excluded.visible_at, lease_owner = NULL, lease_token = NULL, result = NULL, "
+                    "error = NULL, updated = excluded.updated WHERE state != 'leased'")
+        else:
+            sql = sql.replace("INSERT", "INSERT OR IGNORE", 1)
+
+        def steps(conn):
+            ids = []
+            for payload, key, priority in items:
+                cursor = conn.execute(sql, (self.queue, key, json.dumps(payload, ensure_ascii=False), priority,
+                                            self.max_attempts, now, now, now))
+                if not cursor.rowcount:
+                    ids.append(None)
+                elif key is None:
+                    ids.append(cursor.lastrowid)
+                else:
+                    # 覆盖已有任务时 lastrowid 不可靠，按 key 查询
+                    ids.append(conn.execute("SELECT id FROM jobs WHERE queue = ? AND key = ?",
+                                            (self.queue, key)).fetchone()[0])
+            return ids
+        return self._transaction(steps)
+
+    def claim(self, owner, limit=1):
+        """
+        领取最多 limit 个任务，返回 Lease 列表
+
+        可领取的任务包括到达可见时间的排队任务和租约已过期的任务；过期任务的尝试次数已用完时直接转入死信。
+        """
+        now = time.time()
+
+        def steps(conn):
+            # 收回被放弃的租约
+            conn.execute(
+                "UPDATE jobs SET state = 'dead', error = 'lease expired', lease_owner = NULL, lease_token = NULL, "
+                "updated = ? WHERE queue = ? AND state = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, self.queue, now))
+            conn.execute(
+                "UPDATE jobs SET state = 'ready', visible_at = ?, lease_owner = NULL, lease_token = NULL, updated = ? "
+                "WHERE queue = ? AND state = 'leased' AND lease_expires < ?",
+                (now, now, self.queue, now))
+
+            rows = conn.execute(
+                "SELECT id, payload, attempts, max_attempts FROM jobs WHERE queue = ? AND state = 'ready' AND visible_at <= ? "
+                "ORDER BY priority, id LIMIT ?", (self.queue, now, limit)).fetchall()
+            leases = []
+            expires = now + self.visibility_timeout
+            for job_id, payload, attempts, max_attempts in rows:
+                token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_owner = ?, lease_token = ?, "
+                    "lease_expires = ?, updated = ? WHERE id = ?",
+                    (owner, token, expires, now, job_id))
+                leases.append(Lease(job_id, json.loads(payload), attempts + 1, max_attempts, token, expires))
+            return leases
+        return self._transaction(steps)
+
+    def _update_leased(self, lease, sql, params):
+        def steps(conn):
+            return conn.execute(f"UPDATE jobs SET {sql}, updated = ? WHERE id = ? AND lease_token = ? "
+                                f"AND state = 'leased'", (*params, time.time(), lease.id, lease.token)).rowcount
+        if not self._transaction(steps):
+            raise LeaseLost(f"任务 {lease.id} 的租约已失效")
+
+    def heartbeat(self, lease):
+        """续租，租约已被收回时抛出 LeaseLost"""
+        lease.expires = time.time() + self.visibility_timeout
+        self._update_leased(lease, "lease_expires = ?", (lease.expires,))
+
+    def complete(self, lease, result=None):
+        self._update_leased(lease, "state = 'done', result = ?, error = NULL, lease_token = NULL",
+                            (json.dumps(result, ensure_ascii=False),))
+
+    def fail(self, lease, error):
+        """处理失败：按指数退避重新排队，尝试次数达到加入队列时设定的上限后转入死信"""
+        if lease.attempts >= lease.max_attempts:
+            self._update_leased(lease, "state = 'dead', error = ?, lease_token = NULL", (str(error),))
+            return
+        delay = self.retry_delay * 2 ** (lease.attempts - 1)
+        self._update_leased(lease, "state = 'ready', visible_at = ?, error = ?, lease_token = NULL",
+                            (time.time() + delay, str(error)))
+
+    def release(self, lease):
+        """放回未处理的任务（如工作进程正常退出），不计入尝试次数"""
+        self._update_leased(lease, "state = 'ready', visible_at = ?, attempts = attempts - 1, lease_token = NULL",
+                            (time.time(),))
+
+    def stats(self):
+        """返回 {状态: 数量}"""
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs WHERE queue = ? GROUP BY state",
+                                            (self.queue,)).fetchall())
+
+    def dead_letters(self):
+        with self._lock:
+            return self._conn.execute("SELECT id, key, attempts, error FROM jobs WHERE queue = ? AND state = 'dead' "
+                                      "ORDER BY id", (self.queue,)).fetchall()
+
+    def retry_dead(self):
+        """把死信重新放回队列并清零尝试次数，返回数量"""
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET state = 'ready', attempts = 0, visible_at = ?, updated = ? "
+            "WHERE queue = ? AND state = 'dead'", (now, now, self.queue)).rowcount)
+
+    def purge_done(self):
+        """删除已完成的任务，返回数量"""
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM jobs WHERE queue = ? AND state = 'done'", (self.queue,)).rowcount)
+
+    def is_drained(self):
+        """没有排队或租出的任务"""
+        stats = self.stats()
+        return not stats.get("ready") and not stats.get("leased")
+
+    def resolve(self, path):
+        """任务中的相对路径相对于队列文件所在目录，不同机器挂载共享目录的位置可以不同"""
+        return os.path.join(self.root, path)
+
+    def relative(self, path):
+        path = os.path.abspath(path)
+        try:
+            relative = os.path.relpath(path, self.root)
+        except ValueError:  # Windows 下不在同一个盘符
+            return path
+        return path if relative.startswith(os.pardir) else relative
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+async def _pool_ocr(image_path, endpoints):
+    import png2md
+    from endpoint_pool import EndpointPool
+    async with EndpointPool(endpoints) as pool:
+        return await png2md.ocr_image(image_path, pool)
+
+
+def handle_ocr(queue, payload, state):
+    """
+    OCR 一张图片并写出 Markdown
+
+    engine 为 "g4f" 时用 gpt_ocr.ocr_image（g4f 客户端在每个工作进程中只创建一次），
+    为 "pool" 时用 png2md.ocr_image 经 EndpointPool 发往 payload["endpoints"] 中的端点。
+    """
+    image_path = queue.resolve(payload["image"])
+    output_path = queue.resolve(payload["output"])
+    if payload.get("engine", "g4f") == "pool":
+        content = asyncio.run(_pool_ocr(image_path, payload.get("endpoints")))
+    else:
+        import gpt_ocr
+        from g4f.client import Client
+        if "client" not in state:
+            state["client"] = Client()
+        content = gpt_ocr.ocr_image(image_path, state["client"], payload.get("model", gpt_ocr.MODEL))
+    temp_path = output_path + ".part"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp_path, output_path)
+    return {"output": payload["output"], "chars": len(content)}
+
+
+def handle_sleep(queue, payload, state):
+    """本地测试用：等待指定秒数，fail 为真时抛出异常"""
+    time.sleep(payload.get("seconds", 1))
+    if payload.get("fail"):
+        raise RuntimeError("模拟失败")
+    return {"pid": os.getpid()}
+
+
+HANDLERS = {"ocr": handle_ocr, "sleep": handle_sleep}
+
+
+def run_worker(db_path, queue_name="ocr", owner=None, visibility_timeout=300, exit_when_empty=False,
+               poll_interval=2, max_attempts=5, retry_delay=30):
+    """
+    工作进程主循环：领取任务、在后台线程中定期续租、按 payload["kind"] 调用处理函数并提交结果
+
+    续租失败（租约已被收回）时放弃该任务的结果。exit_when_empty=True 时队列中没有排队或租出的任务后退出。
+    返回处理成功的任务数。
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    state = {}
+    done = 0
+    with WorkQueue(db_path, queue_name, visibility_timeout, max_attempts, retry_delay) as queue:
+        while True:
+            leases = queue.claim(owner)
+            if not leases:
+                if exit_when_empty and queue.is_drained():
+                    return done
+                time.sleep(poll_interval)
+                continue
+
+            lease = leases[0]
+            stop = threading.Event()
+            lost = threading.Event()
+
+            def keep_alive():
+                interval = visibility_timeout / 3
+                delay = interval
+                while not stop.wait(delay):
+                    try:
+                        queue.heartbeat(lease)
+                        delay = interval
+                    except LeaseLost:
+                        lost.set()
+                        return
+                    except sqlite3.OperationalError as e:
+                        # 共享目录暂时不可用或锁超时，租约还没过期，尽快重试
+                        print(f"[{owner}] 任务 {lease.id} 续租失败，稍后重试: {e}")
+                        delay = min(interval, 5)
+
+            heartbeat_thread = threading.Thread(target=keep_alive, daemon=True)
+            heartbeat_thread.start()
+            try:
+                handler = HANDLERS[lease.payload.get("kind", queue_name)]
+                result = handler(queue, lease.payload, state)
+                error = None
+            except Exception as e:
+                error = e
+            except KeyboardInterrupt:
+                # 被中断的任务立即放回队列，不必等租约过期
+                stop.set()
+                heartbeat_thread.join()
+                try:
+                    queue.release(lease)
+                    print(f"[{owner}] 已中断，任务 {lease.id} 已放回队列")
+                except LeaseLost as e:
+                    print(f"[{owner}] {e}")
+                return done
+            finally:
+                stop.set()
+                heartbeat_thread.join()
+
+            try:
+                if lost.is_set():
+                    print(f"[{owner}] 任务 {lease.id} 的租约已失效，放弃结果")
+                elif error is None:
+                    queue.complete(lease, result)
+                    done += 1
+                    print(f"[{owner}] 完成任务 {lease.id}")
+                else:
+                    queue.fail(lease, error)
+                    print(f"[{owner}] 任务 {lease.id} 第 {lease.attempts} 次失败: {error}")
+            except LeaseLost as e:
+                print(f"[{owner}] {e}")
+
+
+def enqueue_png_dir(queue, png_dir, model=None, force=False, engine="g4f", endpoints=None):
+    """
+    把目录（pdf2png 的输出）中还没有 .md 的图片加入 OCR 队列，返回新加入（force 时包括重新排队）的数量
+
+    优先级为页码，工作进程按大纲顺序领取；任务以图片路径去重，重复执行不会重复加入。
+    force=True 时已有 .md 的图片也加入，已在队列中（包括已完成和死信）的任务重新排队。
+    """
+    items = []
+    stack = [png_dir]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name.lower().endswith(".png"):
+                    output = os.path.splitext(entry.path)[0] + ".md"
+                    if not force and os.path.exists(output):
+                        continue
+                    payload = {"kind": "ocr", "image": queue.relative(entry.path), "output": queue.relative(output)}
+                    if engine != "g4f":
+                        payload["engine"] = engine
+                    if model:
+                        payload["model"] = model
+                    if endpoints:
+                        payload["endpoints"] = endpoints
+                    page = page_number(entry.path)
+                    items.append((payload, payload["image"], page if page is not None else 1 << 30))
+    return sum(1 for job_id in queue.enqueue_many(items, force) if job_id is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='共享目录上的持久化 OCR 任务队列')
+    parser.add_argument('db', help='队列数据库路径（放在各机器都能访问的共享目录中）')
+    parser.add_argument('--queue', default='ocr', help='队列名，默认为 ocr')
+    parser.add_argument('--visibility-timeout', type=float, default=300, help='租约时长（秒），默认为 300')
+    parser.add_argument('--max-attempts', type=int, default=5, help='转入死信前的最大尝试次数，默认为 5')
+    parser.add_argument('--retry-delay', type=float, default=30, help='首次失败后的重试等待（秒），之后每次加倍，默认为 30')
+    subparsers = parser.add_subparsers(dest='command')
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='把 PNG 目录中尚未 OCR 的图片加入队列')
+    enqueue_parser.add_argument('png_dir', help='PNG 目录（pdf2png 的输出）')
+    enqueue_parser.add_argument('--engine', choices=['g4f', 'pool'], default='g4f',
+                                help='g4f: gpt_ocr 的 g4f 客户端；pool: png2md 的多端点请求池')
+    enqueue_parser.add_argument('--model', help='OCR 模型（g4f），默认为 gpt_ocr.MODEL')
+    enqueue_parser.add_argument('-e', '--endpoint', action='append', help='OCR 端点（pool），可重复指定')
+    enqueue_parser.add_argument('-f', '--force', action='store_true', help='已有 .md 的图片也加入，已在队列中的任务重新排队')
+
+    demo_parser = subparsers.add_parser('demo', help='加入测试任务（每个等待若干秒，可指定失败比例）')
+    demo_parser.add_argument('count', type=int)
+    demo_parser.add_argument('--seconds', type=float, default=1)
+    demo_parser.add_argument('--fail-every', type=int, default=0, help='每 N 个任务中有一个总是失败')
+
+    worker_parser = subparsers.add_parser('worker', help='启动工作进程')
+    worker_parser.add_argument('-p', '--processes', type=int, default=1, help='本机启动的工作进程数，默认为 1')
+    worker_parser.add_argument('--exit-when-empty', action='store_true', help='队列处理完后退出')
+
+    subparsers.add_parser('status', help='显示各状态的任务数')
+    subparsers.add_parser('dead', help='列出死信任务')
+    subparsers.add_parser('retry-dead', help='把死信任务重新放回队列')
+    subparsers.add_parser('purge', help='删除已完成的任务')
+    # python work_queue.py \\\\nas\\ocr\\queue.db enqueue \\\\nas\\ocr\\book
+    # python work_queue.py \\\\nas\\ocr\\queue.db worker -p 4
+    # python work_queue.py queue.db demo 20 --seconds 0.5 --fail-every 7
+    # python work_queue.py --retry-delay 1 queue.db worker -p 4 --exit-when-empty
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        worker_args = (args.db, args.queue, None, args.visibility_timeout, args.exit_when_empty, 2, args.max_attempts,
+                       args.retry_delay)
+        if args.processes <= 1:
+            run_worker(*worker_args)
+            return
+        processes = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return
+
+    with WorkQueue(args.db, args.queue, args.visibility_timeout, args.max_attempts, args.retry_delay) as queue:
+        if args.command == 'enqueue':
+            added = enqueue_png_dir(queue, args.png_dir, args.model, args.force, args.engine, args.endpoint)
+            print(f"已加入 {added} 个任务")
+        elif args.command == 'demo':
+            items = [({"kind": "sleep", "seconds": args.seconds,
+                       "fail": bool(args.fail_every) and i % args.fail_every == 0}, None, 0)
+                     for i in range(1, args.count + 1)]
+            queue.enqueue_many(items)
+            print(f"已加入 {args.count} 个测试任务")
+        elif args.command == 'dead':
+            for job_id, key, attempts, error in queue.dead_letters():
+                print(f"{job_id}\t{key or ''}\t{attempts}\t{error}")
+        elif args.command == 'retry-dead':
+            print(f"已重新排队 {queue.retry_dead()} 个任务")
+        elif args.command == 'purge':
+            print(f"已删除 {queue.purge_done()} 个已完成的任务")
+        elif args.command == 'status':
+            print(", ".join(f"{state} {count}" for state, count in sorted(queue.stats().items())) or "队列为空")
+        else:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()